@@ -0,0 +1,287 @@
+"""Benchmark harness timing the startup phases and the request handling over a
+generated synthetic data, query and template tree, with results as JSON."""
+
+import sys
+
+from os import environ
+from json import dumps
+from time import perf_counter
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Callable
+from pathlib import Path
+from random import Random
+from shutil import copytree
+from argparse import ArgumentParser
+from platform import platform
+from platform import python_version
+from tempfile import TemporaryDirectory
+from statistics import mean
+from statistics import quantiles
+from importlib import import_module
+from importlib.metadata import version
+from urllib.parse import urlparse
+
+# The directory of the example queries and templates copied into generated trees
+EXAMPLE_PATH = Path(__file__).parent.parent.joinpath("example")
+
+# The application sources, imported only once the generated tree is configured
+APPLICATION_PATH = Path(__file__).parent.parent.joinpath("rdfdp")
+
+# The startup functions timed as phases, by module, in the order they run
+STARTUP_PHASES: Dict[str, List[str]] = {
+    "resources": [
+        "load_data_files",
+        "add_media_checksums",
+        "apply_queries",
+        "add_void_descriptions",
+        "collect_document_datasets",
+        "get_document_datasets",
+    ],
+    "routes": ["compile_routes"],
+}
+
+# Words used to generate literals and Markdown bodies
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+
+def generate_markdown(size: int, random: Random) -> str:
+    """Generates a Markdown body of roughly the given size in bytes."""
+
+    paragraphs: List[str] = []
+    length = 0
+
+    while length < size:
+        heading = " ".join(random.choices(WORDS, k=3)).title()
+        words = " ".join(random.choices(WORDS, k=60))
+        paragraph = f"## {heading}\n\n{words}, *{random.choice(WORDS)}*.\n\n"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+
+    return "".join(paragraphs)[:size]
+
+
+def generate_host_data(
+    data_path: Path,
+    host: int,
+    documents: range,
+    args: Any,
+    random: Random,
+) -> None:
+    """Writes the Turtle file of one host with its blog posts and media files."""
+
+    base = f"http://host{host}.example"
+    lines = [
+        "@prefix schema: <https://schema.org/> .",
+        "@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .",
+        "",
+        f'<{base}/> a schema:WebSite ; schema:name "Host {host}" .',
+        f'<{base}/blog> a schema:Blog ; schema:description "Blog {host}" .',
+    ]
+
+    for d in documents:
+        data_path.joinpath(f"post{d}.md").write_text(
+            generate_markdown(args.markdown_size, random), encoding="utf-8"
+        )
+        lines.append(
+            f"<{base}/blog/post{d}> a schema:BlogPosting ;\n"
+            f'    schema:title "Post {d}" ;\n'
+            f'    schema:abstract "{" ".join(random.choices(WORDS, k=12))}" ;\n'
+            f'    schema:datePublished "2025-01-{d % 28 + 1:02}"^^xsd:date ;\n'
+            f"    schema:articleBody <file://./post{d}.md> ;"
+        )
+        # Keywords fill up the document to the requested number of triples
+        keywords = ", ".join(f'"keyword {k}"' for k in range(args.triples - 5))
+        lines.append(f"    schema:keywords {keywords} ." if keywords else "    .")
+
+    for m in range(host, args.media, args.hosts):
+        data_path.joinpath(f"media{m}.bin").write_bytes(
+            random.randbytes(args.media_size)
+        )
+        lines.append(
+            f"<{base}/media/{m}.bin> a schema:MediaObject ;"
+            f" schema:contentUrl <file://./media{m}.bin> ."
+        )
+
+    data_path.joinpath(f"host{host}.ttl").write_text(
+        "\n".join(lines) + "\n", encoding="utf-8"
+    )
+
+
+def generate_tree(path: Path, args: Any) -> None:
+    """Generates the data, query and template directories of a synthetic site."""
+
+    random = Random(args.seed)
+    data_path = path.joinpath("data")
+    data_path.mkdir(parents=True)
+
+    for host in range(args.hosts):
+        generate_host_data(
+            data_path=data_path,
+            host=host,
+            documents=range(host, args.documents, args.hosts),
+            args=args,
+            random=random,
+        )
+
+    copytree(EXAMPLE_PATH.joinpath("queries"), path.joinpath("queries"))
+    copytree(EXAMPLE_PATH.joinpath("templates"), path.joinpath("templates"))
+
+
+def timed(function: Callable, name: str, phases: Dict[str, float]) -> Callable:
+    """Wraps a function to add its run time to the phase of the given name."""
+
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            phases[name] = phases.get(name, 0.0) + perf_counter() - start
+
+    return wrapper
+
+
+def start_application(phases: Dict[str, float]) -> Any:
+    """Imports the application with its startup phases timed."""
+
+    sys.path.append(APPLICATION_PATH.as_posix())
+
+    for module_name, function_names in STARTUP_PHASES.items():
+        module = import_module(module_name)
+        for function_name in function_names:
+            function = getattr(module, function_name)
+            setattr(module, function_name, timed(function, function_name, phases))
+
+    start = perf_counter()
+    application = import_module("app")
+    phases["app"] = perf_counter() - start
+
+    return application
+
+
+def get_latency_stats(latencies: List[float]) -> Dict[str, float]:
+    """Summarizes request latencies in milliseconds and the request rate."""
+
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / sum(latencies),
+        "mean_ms": mean(latencies) * 1000,
+        "p50_ms": percentiles[49] * 1000,
+        "p90_ms": percentiles[89] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+    }
+
+
+def measure_requests(
+    application: Any,
+    mimetype: str,
+    uris: List[str],
+    rounds: int,
+) -> Dict[str, Any]:
+    """Requests the documents in a mimetype, the first round filling the caches."""
+
+    client = application.app.test_client()
+    statuses: Dict[int, int] = {}
+    results: Dict[str, Any] = {}
+
+    for round_name in ("cold", "warm"):
+        latencies: List[float] = []
+        for _ in range(1 if round_name == "cold" else rounds):
+            for uri in uris:
+                parsed_uri = urlparse(uri)
+                start = perf_counter()
+                response = client.get(
+                    parsed_uri.path,
+                    base_url=f"{parsed_uri.scheme}://{parsed_uri.netloc}",
+                    headers={"Accept": mimetype},
+                )
+                response.get_data()
+                latencies.append(perf_counter() - start)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+        results[round_name] = get_latency_stats(latencies)
+
+    results["statuses"] = statuses
+
+    return results
+
+
+def main() -> None:
+    """Generates a synthetic site, starts the application on it, and measures."""
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--triples", type=int, default=20)
+    parser.add_argument("--hosts", type=int, default=2)
+    parser.add_argument("--media", type=int, default=20)
+    parser.add_argument("--media-size", type=int, default=64 * 1024)
+    parser.add_argument("--markdown-size", type=int, default=4096)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--path", type=Path, help="keep the generated tree here")
+    parser.add_argument("--output", type=Path, help="write the JSON results here")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as temporary_path:
+        path = args.path or Path(temporary_path)
+
+        start = perf_counter()
+        generate_tree(path=path, args=args)
+        generate_duration = perf_counter() - start
+
+        environ["DATA_PATH"] = path.joinpath("data").as_posix()
+        environ["QUERIES_PATH"] = path.joinpath("queries").as_posix()
+        environ["TEMPLATE_PATH"] = path.joinpath("templates").as_posix()
+
+        phases: Dict[str, float] = {}
+        application = start_application(phases)
+
+        random = Random(args.seed)
+        document_uris = list(application.app_state.datasets)
+        uris = random.sample(document_uris, min(args.requests, len(document_uris)))
+        media_uris = [
+            r.document_uri
+            for r in application.app_state.routes.values()
+            if r.media_path
+        ][: args.requests]
+
+        requests = {
+            mimetype: measure_requests(application, mimetype, uris, args.rounds)
+            for mimetype in application.ACCEPT_MIMETYPES
+        }
+        if media_uris:
+            requests["media"] = measure_requests(
+                application, "application/octet-stream", media_uris, args.rounds
+            )
+
+    results = {
+        "parameters": {
+            k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+        },
+        "environment": {
+            "python": python_version(),
+            "platform": platform(),
+            "rdflib": version("rdflib"),
+            "flask": version("flask"),
+        },
+        "generate_seconds": generate_duration,
+        "documents": len(document_uris),
+        "phases_seconds": phases,
+        "requests": requests,
+    }
+
+    output = dumps(results, indent=2)
+
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
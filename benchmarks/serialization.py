@@ -0,0 +1,110 @@
+"""Throughput benchmark and round-trip check of the document serializers."""
+
+import sys
+
+from time import perf_counter
+from pathlib import Path
+from argparse import ArgumentParser
+
+from rdflib.term import URIRef
+from rdflib.term import BNode
+from rdflib.term import Literal
+from rdflib.graph import Graph
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF
+from rdflib.namespace import SDO
+from rdflib.namespace import XSD
+
+sys.path.append(Path(__file__).parent.parent.joinpath("rdfdp").as_posix())
+
+# pylint: disable-next=wrong-import-position
+from store import DocumentGraph
+from store import DocumentStore  # pylint: disable=wrong-import-position
+from store import get_namespace_manager  # pylint: disable=wrong-import-position
+from constants import MIMETYPE_FORMATS  # pylint: disable=wrong-import-position
+from serializers import serialize_document  # pylint: disable=wrong-import-position
+
+# The RDFLib parser keywords of the serialization formats
+PARSE_FORMATS = {
+    "turtle": "turtle",
+    "n3": "n3",
+    "json-ld": "json-ld",
+    "nt11": "nt",
+    "pretty-xml": "xml",
+}
+
+
+def generate_documents(documents: int, triples: int) -> DocumentStore:
+    """Generates documents with a mix of the term kinds found in real data."""
+
+    document_store = DocumentStore(
+        namespace_manager=get_namespace_manager(Graph().namespaces())
+    )
+
+    for d in range(documents):
+        document = URIRef(f"http://example.org/document{d}")
+        author = BNode()
+        document_triples = [
+            (document, RDF.type, SDO.BlogPosting),
+            (document, SDO.author, author),
+            (author, SDO.name, Literal(f"Author {d}", lang="en")),
+            (document, SDO.datePublished, Literal("2025-01-01", datatype=XSD.date)),
+            (document, SDO.position, Literal(d)),
+            (document, SDO.isAccessibleForFree, Literal(True)),
+            (document, SDO.text, Literal('Line "one"\r\nline <two> & three\n')),
+            (document, URIRef("http://unbound.example/vocab#rating"), Literal(4.5)),
+        ]
+        for t in range(triples - len(document_triples)):
+            document_triples.append((document, SDO.keywords, Literal(f"keyword {t}")))
+        document_store.add(document_uri=document, triples=document_triples)
+
+    return document_store
+
+
+def check_round_trip(document_graph: DocumentGraph, format_keyword: str) -> bool:
+    """Checks that the output parses back into the same graph."""
+
+    body = serialize_document(document_graph, format_keyword=format_keyword)
+    parsed_graph = Graph().parse(data=body, format=PARSE_FORMATS[format_keyword])
+
+    return isomorphic(parsed_graph, document_graph.to_graph())
+
+
+def main() -> None:
+    """Times both serializers for every format and checks their equivalence."""
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--triples", type=int, default=30)
+    args = parser.parse_args()
+
+    document_store = generate_documents(args.documents, args.triples)
+    failures = 0
+
+    for format_keyword in dict.fromkeys(MIMETYPE_FORMATS.values()):
+        if format_keyword not in PARSE_FORMATS:
+            continue
+        start = perf_counter()
+        for document_graph in document_store.values():
+            document_graph.serialize(format=format_keyword, encoding="utf-8")
+        rdflib_rate = len(document_store) / (perf_counter() - start)
+        start = perf_counter()
+        for document_graph in document_store.values():
+            serialize_document(document_graph, format_keyword=format_keyword)
+        lean_rate = len(document_store) / (perf_counter() - start)
+        equivalent = all(
+            check_round_trip(g, format_keyword) for g in document_store.values()
+        )
+        failures += not equivalent
+        print(
+            f"{format_keyword:>12} {rdflib_rate:>10.0f} docs/s with RDFLib"
+            f" {lean_rate:>10.0f} docs/s lean {lean_rate / rdflib_rate:>6.1f}x"
+            f" {'round-trips' if equivalent else 'DIFFERS'}"
+        )
+
+    if failures:
+        sys.exit(f"{failures} formats do not round-trip to the same graph")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Regression benchmark for the VoID grouping and generation at startup."""
+
+import sys
+
+from time import perf_counter
+from pathlib import Path
+from argparse import ArgumentParser
+
+from rdflib.term import URIRef
+from rdflib.term import BNode
+from rdflib.term import Literal
+from rdflib.graph import Graph
+from rdflib.namespace import RDF
+from rdflib.namespace import SDO
+
+sys.path.append(Path(__file__).parent.parent.joinpath("rdfdp").as_posix())
+
+# pylint: disable-next=wrong-import-position
+from resources import add_void_descriptions
+
+
+def generate_graph(documents: int, triples: int, hosts: int) -> Graph:
+    """Generates documents with the given number of triples spread over hosts."""
+
+    graph = Graph()
+
+    for d in range(documents):
+        document = URIRef(f"http://host{d % hosts}.example/document{d}")
+        graph.add((document, RDF.type, SDO.CreativeWork))
+        for t in range(triples - 3):
+            graph.add((document, SDO.keywords, Literal(f"keyword {t}")))
+        author = BNode()
+        graph.add((document, SDO.author, author))
+        graph.add((author, SDO.name, Literal(f"Author {d}")))
+
+    return graph
+
+
+def main() -> None:
+    """Times the VoID stage over doubling dataset sizes and checks the scaling."""
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=250)
+    parser.add_argument("--triples", type=int, default=20)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    args = parser.parse_args()
+
+    per_triple: list[float] = []
+
+    for step in range(args.steps):
+        documents = args.documents * 2**step
+        graph = generate_graph(documents, args.triples, args.hosts)
+        size = len(graph)
+        start = perf_counter()
+        add_void_descriptions(graph=graph)
+        duration = perf_counter() - start
+        per_triple.append(duration / size)
+        print(f"{size:>10} triples {duration:>10.3f} s {per_triple[-1] * 1e6:>8.2f} us")
+
+    growth = per_triple[-1] / per_triple[0]
+
+    print(f"Per-triple cost grew {growth:.2f}x over {args.steps} doublings")
+
+    if growth > args.tolerance:
+        sys.exit(f"Scaling is worse than linear, over {args.tolerance}x tolerance")
+
+
+if __name__ == "__main__":
+    main()
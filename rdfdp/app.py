@@ -3,18 +3,28 @@
 from http import HTTPStatus
 from typing import Any
 from typing import Dict
+from typing import Hashable
+from typing import Set
+from typing import Tuple
+from typing import NamedTuple
+from time import perf_counter
+from hashlib import sha256
+from os.path import getsize
 from logging import basicConfig
 from logging import DEBUG
 from logging import INFO
 from logging import debug
+from logging import info
 from logging import error
 from logging import warning
 from logging import exception
 from datetime import datetime
 from datetime import timezone
+from urllib.parse import urljoin
 from traceback import format_exc
 
 from flask import Flask
+from flask import g
 from flask import request
 from flask import render_template
 from flask import send_file
@@ -22,30 +32,73 @@ from flask.wrappers import Response
 
 from jinja2.exceptions import TemplateNotFound
 
+from werkzeug.http import quote_etag
 from werkzeug.exceptions import HTTPException
 from werkzeug.exceptions import NotFound
 from werkzeug.exceptions import NotAcceptable
+from werkzeug.exceptions import BadRequest
 
 from rdflib.term import URIRef
-from rdflib.term import Literal
-from rdflib.namespace import RDF
-from rdflib.namespace import OWL
-from rdflib.namespace import SDO
+from rdflib.graph import Graph
 
 from resources import get_document_datasets
-from utils import uri_to_path
+from resources import get_files_modified
+from resources import get_dump_path
 from utils import sort_by_predicate
-from utils import remove_file_uris
+from utils import group_by_predicate
 from utils import markdown_to_html
 from utils import get_request_host
 from utils import get_request_hostname
 from utils import get_request_proto
 from templates import load_templates
-from templates import find_template
+from templates import get_template_files
+from templates import get_template_modified
 from templates import TEMPLATE_PATH
+from reload import DatasetReloader
+from ranges import send_media_file
+from routes import RouteKey
+from routes import DocumentRoute
+from routes import get_route_key
+from routes import compile_routes
+from routes import assign_templates
+from routes import negotiate_mimetype
+from responses import ResponseCache
+from responses import CachedResponse
+from responses import create_cached_response
+from responses import get_not_modified_response
+from store import DocumentDatasets
+from store import LazyDocumentStore
+from serializers import STREAMING_FORMATS
+from serializers import stream_document
+from serializers import serialize_document
+from dumps import write_dumps
+from dumps import get_dataset_uri
+from fragments import FRAGMENT_MIMETYPES
+from fragments import FragmentIndex
+from fragments import PATTERN_PARAMETERS
+from fragments import parse_term
+from fragments import get_fragment_page
+from fragments import create_fragment_index
+from batches import BATCH_MIMETYPES
+from batches import BATCH_MIMETYPE_FORMATS
+from batches import CONCATENATED_FORMATS
+from batches import NAMED_GRAPH_MIMETYPE_FORMATS
+from batches import NAMED_GRAPH_SOURCE_MIMETYPES
+from batches import to_trig
+from batches import to_nquads
+from batches import merge_documents
+from compressors import get_compressors
+from compressors import SUPPORTED_ENCODINGS
+from metrics import METRICS_MIMETYPE
+from metrics import create_request_metrics
+from metrics import format_samples
+from metrics import render_caches
+from metrics import render_startup_phases
+from metrics import startup_phase
 from constants import ACCEPT_MIMETYPES
 from constants import MIMETYPE_FORMATS
 from constants import HTTP_HEADER_DATE_FORMAT
+from constants import CONFIG_TRUE_VALUES
 
 # The Flask application, with template clean-ups
 app = Flask(import_name=__name__, template_folder=TEMPLATE_PATH)
@@ -54,10 +107,51 @@ app.jinja_env.trim_blocks = True
 
 # Custom filters
 app.jinja_env.filters["sort_by_predicate"] = sort_by_predicate
+app.jinja_env.filters["group_by_predicate"] = group_by_predicate
 app.jinja_env.filters["markdown_to_html"] = markdown_to_html
 
 # Assign the compression defaults based on internal type support
-app.config.setdefault("COMPRESS_MIMETYPES", ACCEPT_MIMETYPES)
+app.config.setdefault(
+    "COMPRESS_MIMETYPES", (*ACCEPT_MIMETYPES, *NAMED_GRAPH_MIMETYPE_FORMATS)
+)
+app.config.setdefault("COMPRESS_ALGORITHM", SUPPORTED_ENCODINGS)
+app.config.setdefault("COMPRESS_LEVEL", 6)
+app.config.setdefault("COMPRESS_ZSTD_LEVEL", 3)
+app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+
+# Largest on-disk media file in bytes that is compressed while serving a request
+app.config.setdefault("MEDIA_COMPRESS_MAX_SIZE", 1024 * 1024)
+
+# Interval in seconds for polling files for changes, or zero to disable reloading
+app.config.setdefault("WATCH_INTERVAL", 0)
+
+# Memory bound for serialized responses in bytes, and whether to fill it at startup
+app.config.setdefault("RESPONSE_CACHE_SIZE", 64 * 1024 * 1024)
+app.config.setdefault("RESPONSE_CACHE_WARMUP", False)
+
+# Documents with at least this many triples are streamed in N-Triples and Turtle
+# without caching, or zero to disable streaming
+app.config.setdefault("STREAM_MIN_TRIPLES", 10000)
+
+# Whether to collect request metrics and serve them at the metrics path
+app.config.setdefault("METRICS", False)
+app.config.setdefault("METRICS_PATH", "/metrics")
+
+# Whether to serve Triple Pattern Fragments at the fragments path, and the number
+# of triples per page
+app.config.setdefault("FRAGMENTS", False)
+app.config.setdefault("FRAGMENTS_PATH", "/fragments")
+app.config.setdefault("FRAGMENTS_PAGE_SIZE", 100)
+
+# Whether to serve batches of documents at the batch path, and the number of
+# documents per batch
+app.config.setdefault("BATCH", False)
+app.config.setdefault("BATCH_PATH", "/batch")
+app.config.setdefault("BATCH_MAX_DOCUMENTS", 100)
+
+# Whether the application is loaded before forking workers, which defers starting
+# background threads until start_background_tasks is called in each worker
+app.config.setdefault("PRELOAD", False)
 
 # Load configuration from environment variables if available
 app.config.from_prefixed_env()
@@ -69,10 +163,366 @@ basicConfig(
     level=DEBUG if app.debug else INFO,
 )
 
+
+class AppState(NamedTuple):
+    """The data being served, replaced as a whole on reloads so that a request
+    only ever sees routes, documents and fragments that belong together."""
+
+    generation: int
+    datasets: DocumentDatasets
+    templates: Dict[str, Dict[str, str]]
+    routes: Dict[RouteKey, DocumentRoute]
+    fragments: FragmentIndex | None
+
+
+def create_app_state() -> AppState:
+    """Loads the data, and prepares everything derived from it."""
+
+    # The reloader loads the data itself, keeping the parsed files for reloads
+    document_datasets = (
+        get_document_datasets() if app_reloader is None else app_reloader.load()
+    )
+    templates = load_templates()
+    # Write the dumps before their routes, which resolve their files
+    if app_dump_path:
+        with startup_phase("write_dumps"):
+            write_dumps(
+                document_datasets,
+                app_dump_path,
+                files_modified=get_files_modified(),
+            )
+
+    with startup_phase("compile_routes"):
+        routes = compile_routes(document_datasets, templates)
+
+    fragments = None
+
+    if app.config["FRAGMENTS"] in CONFIG_TRUE_VALUES:
+        with startup_phase("index_fragments"):
+            fragments = create_fragment_index(document_datasets)
+
+    return AppState(
+        generation=0,
+        datasets=document_datasets,
+        templates=templates,
+        routes=routes,
+        fragments=fragments,
+    )
+
+
 # Collect the application dataset into cache at the beginning
-app_datasets = get_document_datasets()
-app_templates = load_templates()
 app_startup = datetime.now(tz=timezone.utc)
+app_dump_path = get_dump_path()
+app_reloader = DatasetReloader() if float(app.config["WATCH_INTERVAL"]) > 0 else None
+app_state = create_app_state()
+
+app_responses = ResponseCache(max_size=int(app.config["RESPONSE_CACHE_SIZE"]))
+app_compressors = get_compressors(
+    algorithms=(
+        app.config["COMPRESS_ALGORITHM"].split(",")
+        if isinstance(app.config["COMPRESS_ALGORITHM"], str)
+        else app.config["COMPRESS_ALGORITHM"]
+    ),
+    level=int(app.config["COMPRESS_LEVEL"]),
+    zstd_level=int(app.config["COMPRESS_ZSTD_LEVEL"]),
+)
+app_metrics = (
+    create_request_metrics() if app.config["METRICS"] in CONFIG_TRUE_VALUES else None
+)
+
+
+def mark_stage(stage: str) -> None:
+    """Adds the time since the previous stage of the request to the given stage,
+    when metrics are enabled."""
+
+    if app_metrics is None:
+        return
+
+    now = perf_counter()
+    g.metric_stages[stage] = g.metric_stages.get(stage, 0.0) + now - g.metric_time
+    g.metric_time = now
+
+
+def cache_response(
+    key: Hashable,
+    mimetype: str,
+    body: bytes,
+    generation: int,
+) -> CachedResponse:
+    """Caches the response body built from a generation of the data, together with
+    its compressed variants if any."""
+
+    compress = (
+        str(mimetype) in app.config["COMPRESS_MIMETYPES"]
+        and len(body) >= app.config["COMPRESS_MIN_SIZE"]
+    )
+
+    return app_responses.put(
+        key=key,
+        entry=create_cached_response(
+            body=body,
+            compressors=app_compressors if compress else None,
+        ),
+        generation=generation,
+    )
+
+
+def send_cached_response(
+    cached_response: CachedResponse,
+    mimetype: str,
+    etag: str | None = None,
+) -> Response:
+    """Returns the cached response body in the best encoding for the client, with
+    the given ETag or the hash of the body."""
+
+    etag = etag or cached_response.sha256[:32]
+    encoding = request.accept_encodings.best_match(tuple(cached_response.encoded))
+
+    if encoding:
+        response = Response(
+            response=cached_response.encoded[encoding],
+            mimetype=mimetype,
+            headers={"Content-Encoding": encoding},
+        )
+        response.set_etag(f"{etag}-{encoding}")
+    else:
+        response = Response(response=cached_response.body, mimetype=mimetype)
+        response.set_etag(etag)
+
+    return response
+
+
+def get_document_validators(
+    route: DocumentRoute,
+    mimetype: str,
+    cache_key: Hashable | None,
+) -> Tuple[str | None, datetime]:
+    """Derives the ETag of a document representation from the content hash of the
+    document, together with the template inputs for HTML, or None when the document
+    has no content hash or its HTML depends on the request, and its Last-Modified,
+    which for HTML includes the latest change of the templates in its key."""
+
+    if mimetype != "text/html":
+        variant, last_modified = mimetype, route.last_modified
+    elif cache_key is not None:
+        variant = repr(cache_key[2:])  # type: ignore[index]
+        last_modified = max(
+            route.last_modified,
+            datetime.fromtimestamp(cache_key[3] / 1e9, tz=timezone.utc),  # type: ignore[index]
+        )
+    else:
+        return None, route.last_modified
+
+    if route.content_hash is None:
+        return None, last_modified
+
+    return (
+        sha256(
+            f"{route.content_hash} {variant}".encode("utf-8"), usedforsecurity=False
+        ).hexdigest()[:32],
+        last_modified,
+    )
+
+
+def warm_up_response_cache() -> None:
+    """Serializes every document in every RDF format into the response cache."""
+
+    info("Warming up response cache")
+
+    state = app_state
+
+    for document_uri, document_graph in state.datasets.items():
+        for mimetype, format_keyword in MIMETYPE_FORMATS.items():
+            if format_keyword != "html":
+                cache_response(
+                    key=(document_uri, mimetype),
+                    mimetype=mimetype,
+                    body=serialize_document(
+                        document_graph, format_keyword=format_keyword
+                    ),
+                    generation=state.generation,
+                )
+
+    if app_responses.evictions:
+        warning(f"Response cache too small, evicted {app_responses.evictions} entries")
+
+    info(f"Cached {len(app_responses)} responses in {app_responses.size} bytes")
+
+
+if app.config["RESPONSE_CACHE_WARMUP"] in CONFIG_TRUE_VALUES:
+    warm_up_response_cache()
+
+
+def reload_datasets(
+    dataset: Graph,
+    document_datasets: DocumentDatasets,
+    changed_documents: Set[URIRef],
+) -> None:
+    """Swaps in reloaded document datasets and drops their outdated responses."""
+
+    global app_state  # pylint: disable=global-statement
+
+    if app_dump_path:
+        write_dumps(
+            document_datasets,
+            app_dump_path,
+            dataset_uris={get_dataset_uri(u) for u in changed_documents},
+        )
+
+    app_state = app_state._replace(
+        generation=app_state.generation + 1,
+        datasets=document_datasets,
+        routes=compile_routes(
+            document_datasets,
+            app_state.templates,
+            previous_routes=app_state.routes,
+            changed_documents=changed_documents,
+        ),
+        fragments=(
+            None
+            if app_state.fragments is None
+            else create_fragment_index(document_datasets)
+        ),
+    )
+    evicted = app_responses.evict(
+        lambda key: key[0] in changed_documents,
+        generation=app_state.generation,
+    )
+
+    info(f"Serving {len(dataset)} triples, evicted {evicted} cached responses")
+
+
+def reload_templates() -> None:
+    """Reloads the template lookup after template files have changed."""
+
+    global app_state  # pylint: disable=global-statement
+
+    load_templates.cache_clear()
+    get_template_files.cache_clear()
+    templates = load_templates()
+    app_state = app_state._replace(
+        generation=app_state.generation + 1,
+        templates=templates,
+        routes=assign_templates(app_state.routes, app_state.datasets, templates),
+    )
+    evicted = app_responses.evict(
+        lambda key: key[1] == "text/html",
+        generation=app_state.generation,
+    )
+
+    info(f"Reloaded templates, evicted {evicted} cached responses")
+
+
+def start_background_tasks() -> None:
+    """Starts the background threads, which do not survive forking workers."""
+
+    if app_reloader is not None:
+        app.jinja_env.auto_reload = True
+        app_reloader.start(
+            interval=float(app.config["WATCH_INTERVAL"]),
+            on_datasets=reload_datasets,
+            on_templates=reload_templates,
+        )
+
+
+if app.config["PRELOAD"] not in CONFIG_TRUE_VALUES:
+    start_background_tasks()
+
+
+def send_static_document(
+    route: DocumentRoute,
+    mimetype: str,
+    generation: int,
+) -> Response:
+    """Return the on-disk file of a schema:MediaObject document."""
+
+    assert route.media_path, f"Missing schema:contentUrl on {route.document_uri.n3()}"
+
+    debug(f"Serving static document from {route.media_path}")
+
+    # Attempt to use X-Accel-Redirect if enables for nginx
+    if app.config.get("USE_X_ACCEL_REDIRECT") in CONFIG_TRUE_VALUES:
+        return Response(
+            status=HTTPStatus.OK,
+            headers={"X-Accel-Redirect": route.media_path},
+            mimetype=mimetype,
+        )
+
+    # Fall back to Flask's X-SendFile support when enabled
+    if app.config.get("USE_X_SENDFILE"):
+        return send_file(path_or_file=route.media_path, mimetype=mimetype, etag=True)
+
+    # Compress the file once when it is worth compressing and small enough,
+    # leaving range requests to the uncompressed file
+    if (
+        mimetype in app.config["COMPRESS_MIMETYPES"]
+        and request.range is None
+        and request.accept_encodings.best_match(tuple(app_compressors))
+        and getsize(route.media_path)
+        <= min(int(app.config["MEDIA_COMPRESS_MAX_SIZE"]), app_responses.max_size)
+    ):
+        cache_key = (route.document_uri, mimetype, route.media_path)
+        cached_response = app_responses.get(key=cache_key)
+        if cached_response is None:
+            with open(route.media_path, "rb") as document_file:
+                cached_response = cache_response(
+                    key=cache_key,
+                    mimetype=mimetype,
+                    body=document_file.read(),
+                    generation=generation,
+                )
+        if cached_response.encoded:
+            return send_cached_response(cached_response, mimetype=mimetype)
+
+    # Send the file with range support, and the precomputed checksum as ETag
+    return send_media_file(
+        request,
+        path=route.media_path,
+        mimetype=mimetype,
+        etag=route.media_etag,
+    )
+
+
+def get_html_cache_key(route: DocumentRoute) -> Hashable | None:
+    """Keys the rendered HTML of a document by its template, the latest change to
+    the template files it depends on, and the template context values, or returns
+    None when the template output depends on the request."""
+
+    assert route.template_name, f"Missing template for {route.document_uri.n3()}"
+
+    template_modified = get_template_modified(app.jinja_env, route.template_name)
+
+    if template_modified is None:
+        return None
+
+    return (
+        route.document_uri,
+        "text/html",
+        route.template_name,
+        template_modified,
+        tuple(handle_context().items()),
+    )
+
+
+def get_cached_document_response(
+    cache_key: Hashable | None,
+    mimetype: str,
+    etag: str | None,
+) -> Response | None:
+    """Returns the previously serialized or rendered representation of a document,
+    or None when it is not cached."""
+
+    if cache_key is None:
+        return None
+
+    cached_response = app_responses.get(key=cache_key)
+
+    mark_stage("cache")
+
+    if cached_response is None:
+        return None
+
+    return send_cached_response(cached_response, mimetype=mimetype, etag=etag)
 
 
 @app.get("/")
@@ -80,134 +530,266 @@ app_startup = datetime.now(tz=timezone.utc)
 def get_document(path: str = "/") -> Response:
     """Return a document-scoped collection of CBDs in the client-preferrec format."""
 
-    # Find the document graph based on original client-facing URI
-    document_uri = URIRef(
-        value=path, base=f"{get_request_proto()}://{get_request_host()}"
-    )
+    # Read the data being served once, as a reload may replace it at any time
+    state = app_state
 
-    if document_uri not in app_datasets:
-        raise NotFound()
+    # Find the response plan based on original client-facing URI
+    route = state.routes.get(
+        (get_request_proto(), get_request_host(), f"/{path.lstrip('/')}")
+    )
 
-    document_graph = app_datasets[document_uri]
-    document_mimetype: str | None = None
+    mark_stage("lookup")
 
-    available_mimetypes = ACCEPT_MIMETYPES
+    if route is None:
+        raise NotFound()
 
-    # Check if the document is a schema:MediaObject with mimetype
-    if (document_uri, RDF.type, SDO.MediaObject) in document_graph:
-        document_encoding_format = document_graph.value(
-            subject=document_uri,
-            predicate=SDO.encodingFormat,
-        )
-        assert isinstance(
-            document_encoding_format, Literal
-        ), f"Missing schema:encodingFormat on {document_uri.n3()}"
-        document_mimetype = document_encoding_format
-        available_mimetypes = tuple(
-            (document_mimetype, *(m for m in ACCEPT_MIMETYPES if m != "text/html"))
-        )
+    g.last_modified = route.last_modified
 
-    mimetype = (
-        request.accept_mimetypes.best_match(available_mimetypes)
-        if request.accept_mimetypes.provided
-        else available_mimetypes[0]
+    mimetype = negotiate_mimetype(
+        accept_header=request.headers.get("Accept", ""),
+        mimetypes=route.mimetypes,
     )
 
+    mark_stage("negotiation")
+
     if not mimetype:
         raise NotAcceptable()
 
-    same_as = document_graph.value(subject=document_uri, predicate=OWL.sameAs)
+    g.metric_mimetype = mimetype
 
-    if same_as and isinstance(same_as, URIRef):
+    if route.redirect:
         return Response(
             status=HTTPStatus.TEMPORARY_REDIRECT,
-            headers={"location": same_as},
+            headers={"location": route.redirect},
         )
 
-    if mimetype == document_mimetype:
-        document_file_uri = document_graph.value(
-            subject=document_uri,
-            predicate=SDO.contentUrl,
+    if mimetype == route.media_mimetype:
+        return send_static_document(
+            route, mimetype=mimetype, generation=state.generation
         )
-        assert isinstance(
-            document_file_uri, URIRef
-        ), f"Missing schema:contentUrl on {document_uri.n3()}"
-
-        document_file_path = uri_to_path(document_file_uri).as_posix()
-        debug(f"Serving static document from {document_file_path}")
-
-        # Attempt to use X-Accel-Redirect if enables for nginx
-        if app.config.get("USE_X_ACCEL_REDIRECT") in ("true", "True", True, 1, "1"):
-            return Response(
-                status=HTTPStatus.OK,
-                headers={"X-Accel-Redirect": document_file_path},
-                mimetype=mimetype,
-            )
-
-        # Fall back to Flask's X-SendFile support
-        return send_file(path_or_file=document_file_path, mimetype=mimetype, etag=True)
 
+    document_uri = route.document_uri
     format_keyword = MIMETYPE_FORMATS[mimetype]
 
-    # Remove the actual file URI before serving the graph
-    document_graph = remove_file_uris(graph=document_graph)
+    if format_keyword == "html" and not route.template_name:
+        warning(f"No {format_keyword} template found for {document_uri.n3()}")
+        raise NotAcceptable()
+
+    cache_key = (
+        get_html_cache_key(route)
+        if format_keyword == "html"
+        else (document_uri, mimetype)
+    )
+    etag, g.last_modified = get_document_validators(
+        route, mimetype=mimetype, cache_key=cache_key
+    )
+
+    # Answer revalidations before any cache lookup or graph work, and serve
+    # previously serialized or rendered representations without the graph
+    response = get_not_modified_response(
+        etag,
+        last_modified=g.last_modified,
+        mimetype=mimetype,
+        encodings=app_compressors,
+    )
+
+    if response is None:
+        response = get_cached_document_response(cache_key, mimetype, etag=etag)
+
+    if response is not None:
+        return response
+
+    # Get the public triples that are safe to expose as they are
+    document_graph = state.datasets.get(document_uri)
+
+    mark_stage("lookup")
+
+    if document_graph is None:
+        raise NotFound()
 
     # Helps identify content negotiation issues
     debug(f"Serving {document_uri.n3()} as {mimetype}")
 
-    if format_keyword == "html":
-        document_type_uris = (
-            u
-            for u in document_graph.objects(
-                subject=document_uri,
-                predicate=RDF.type,
-                unique=True,
-            )
-            if isinstance(u, URIRef)
+    # Stream large documents in chunks instead of serializing them into memory
+    if format_keyword in STREAMING_FORMATS and 0 < int(
+        app.config["STREAM_MIN_TRIPLES"]
+    ) <= len(document_graph):
+        return Response(
+            response=stream_document(document_graph, format_keyword=format_keyword),
+            mimetype=mimetype,
+            headers={"ETag": quote_etag(etag)} if etag else None,
         )
-        template_name, template_type = find_template(
-            uri=document_uri,
-            type_uris=document_type_uris,
-            app_templates=app_templates,
+
+    if format_keyword == "html":
+        html_string = render_template(
+            app_debug=app.debug,
+            template_name_or_list=route.template_name,
+            template_type=route.template_type,
+            document_uri=document_uri,
+            document_graph=document_graph.indexed(),
         )
-        if template_name:
-            html_string = render_template(
-                app_debug=app.debug,
-                template_name_or_list=template_name,
-                template_type=template_type,
-                document_uri=document_uri,
-                document_graph=document_graph,
-            )
+        mark_stage("rendering")
+        if cache_key is None:
             return Response(response=html_string, mimetype=mimetype)
+        body = html_string.encode("utf-8")
     else:
-        return Response(
-            response=document_graph.serialize(format=format_keyword, encoding="utf-8"),
+        body = serialize_document(document_graph, format_keyword=format_keyword)
+        mark_stage("serialization")
+
+    cached_response = cache_response(
+        key=cache_key, mimetype=mimetype, body=body, generation=state.generation
+    )
+
+    return send_cached_response(cached_response, mimetype=mimetype, etag=etag)
+
+
+def get_fragment() -> Response:
+    """Return a page of the Triple Pattern Fragment selected by the query string,
+    in the client-preferred format."""
+
+    fragment_index = app_state.fragments
+
+    assert fragment_index is not None, "Fragments are disabled"
+
+    mimetype = negotiate_mimetype(
+        accept_header=request.headers.get("Accept", ""),
+        mimetypes=FRAGMENT_MIMETYPES,
+    )
+
+    if not mimetype:
+        raise NotAcceptable()
+
+    page = request.args.get("page", default=1, type=int)
+
+    if page < 1:
+        raise BadRequest(f"Invalid page {page}")
+
+    fragment_page = get_fragment_page(
+        fragment_index=fragment_index,
+        base_uri=(
+            f"{get_request_proto()}://{get_request_host()}"
+            f"{app.config['FRAGMENTS_PATH']}"
+        ),
+        pattern=tuple(  # type: ignore[arg-type]
+            parse_term(request.args.get(name)) for name in PATTERN_PARAMETERS
+        ),
+        page=page,
+        page_size=int(app.config["FRAGMENTS_PAGE_SIZE"]),
+    )
+
+    return Response(
+        response=serialize_document(
+            fragment_page, format_keyword=MIMETYPE_FORMATS[mimetype]
+        ),
+        mimetype=mimetype,
+    )
+
+
+if app_state.fragments is not None:
+    app.add_url_rule(app.config["FRAGMENTS_PATH"], view_func=get_fragment)
+
+
+def get_document_body(state: AppState, document_uri: URIRef, mimetype: str) -> bytes:
+    """Returns a document serialized in a format, from the response cache or into
+    it, so that batches and single documents share their representations."""
+
+    cache_key = (document_uri, mimetype)
+    cached_response = app_responses.get(key=cache_key)
+
+    if cached_response is None:
+        document_graph = state.datasets.get(document_uri)
+        if document_graph is None:
+            raise NotFound(f"Unknown document {document_uri}")
+        cached_response = cache_response(
+            key=cache_key,
             mimetype=mimetype,
+            body=serialize_document(
+                document_graph, format_keyword=MIMETYPE_FORMATS[mimetype]
+            ),
+            generation=state.generation,
+        )
+
+    return cached_response.body
+
+
+def get_batch() -> Response:
+    """Return the documents given by the uri parameters, merged into one graph or
+    as named graphs, in the client-preferred format."""
+
+    mimetype = negotiate_mimetype(
+        accept_header=request.headers.get("Accept", ""),
+        mimetypes=BATCH_MIMETYPES,
+    )
+
+    if not mimetype:
+        raise NotAcceptable()
+
+    uris = request.values.getlist("uri")
+
+    if not uris:
+        raise BadRequest("No documents requested")
+
+    if len(uris) > int(app.config["BATCH_MAX_DOCUMENTS"]):
+        raise BadRequest(f"More than {app.config['BATCH_MAX_DOCUMENTS']} documents")
+
+    # Resolve the documents like their own requests would, relative to this host
+    state = app_state
+    base_uri = f"{get_request_proto()}://{get_request_host()}/"
+    document_uris: Dict[URIRef, None] = {}
+
+    for uri in uris:
+        route = state.routes.get(get_route_key(urljoin(base_uri, uri)))
+        if route is None or route.redirect:
+            raise NotFound(f"Unknown document {uri}")
+        document_uris[route.document_uri] = None
+
+    format_keyword = BATCH_MIMETYPE_FORMATS[mimetype]
+
+    if format_keyword in NAMED_GRAPH_SOURCE_MIMETYPES:
+        source_mimetype = NAMED_GRAPH_SOURCE_MIMETYPES[format_keyword]
+        to_named_graph = to_trig if format_keyword == "trig" else to_nquads
+        body = b"".join(
+            to_named_graph(get_document_body(state, u, source_mimetype), u)
+            for u in document_uris
+        )
+    elif format_keyword in CONCATENATED_FORMATS:
+        body = b"".join(get_document_body(state, u, mimetype) for u in document_uris)
+    else:
+        body = serialize_document(
+            merge_documents(
+                state.datasets,
+                document_uris=list(document_uris),
+                batch_uri=URIRef(request.url),
+            ),
+            format_keyword=format_keyword,
         )
 
-    warning(f"No {format_keyword} template found for {document_uri.n3()}")
+    return Response(response=body, mimetype=mimetype)
 
-    raise NotAcceptable()
+
+if app.config["BATCH"] in CONFIG_TRUE_VALUES:
+    app.add_url_rule(
+        app.config["BATCH_PATH"], view_func=get_batch, methods=("GET", "POST")
+    )
 
 
 @app.before_request
 def request_preprocess() -> Response | None:
     """Performs common preprocessing on the request."""
 
+    if app_metrics is not None:
+        g.metric_time = perf_counter()
+        g.metric_stages = {}
+
     if request.method in ("GET", "HEAD"):
-        # Handle requests with If-Modified-Since
+        # Reject requests with malformed If-Modified-Since
         modified_since_header = request.headers.get("If-Modified-Since")
         if modified_since_header:
             try:
-                modified_since_utc = datetime.strptime(
-                    modified_since_header,
-                    HTTP_HEADER_DATE_FORMAT,
-                ).replace(tzinfo=timezone.utc)
+                datetime.strptime(modified_since_header, HTTP_HEADER_DATE_FORMAT)
             except ValueError:
                 error(f'Malformed If-Modified-Since header: "{modified_since_header}"')
                 return Response(status=HTTPStatus.BAD_REQUEST)
-            if app_startup < modified_since_utc:
-                return Response(status=HTTPStatus.NOT_MODIFIED)
 
     return None
 
@@ -220,20 +802,133 @@ def request_postprocess(response: Response) -> Response:
         response.status_code >= 200
         and response.status_code < 400
         and request.method in ("GET", "HEAD")
+        and response.last_modified is None
     ):
-        response.headers.set(
-            "Last-Modified",
-            app_startup.strftime(HTTP_HEADER_DATE_FORMAT),
-        )
+        response.last_modified = g.get("last_modified") or app_startup
+
+    if request.endpoint in ("get_document", "get_fragment", "get_batch"):
+        response.vary.add("Accept")
+
+    if response.mimetype in app.config["COMPRESS_MIMETYPES"]:
+        response.vary.add("Accept-Encoding")
+        compress_response(response=response)
+
+    mark_stage("response")
+
+    # Answer conditional requests, also for responses that bypass the cache
+    if (
+        response.status_code == HTTPStatus.OK
+        and request.method in ("GET", "HEAD")
+        and not response.direct_passthrough
+        and not response.is_streamed
+    ):
+        if not response.get_etag()[0]:
+            response.add_etag()
+        response.make_conditional(request)
 
     if app.debug and "Origin" in request.headers:
         response.headers.set("Access-Control-Allow-Origin", request.headers["Origin"])
         response.headers.set("Access-Control-Allow-Methods", "GET, HEAD, OPTIONS")
         response.headers.set("Access-Control-Allow-Credentials", "true")
 
+    if app_metrics is not None and request.endpoint == "get_document":
+        observe_request(response=response)
+
     return response
 
 
+def observe_request(response: Response) -> None:
+    """Adds the stage durations, status and body size of a document request to
+    the metrics, by negotiated mimetype."""
+
+    assert app_metrics is not None, "Metrics are disabled"
+
+    mimetype = g.get("metric_mimetype") or response.mimetype or ""
+
+    for stage, duration in g.get("metric_stages", {}).items():
+        app_metrics.stages.observe((mimetype, stage), duration)
+
+    app_metrics.requests.inc((mimetype, str(response.status_code)))
+
+    # Streamed responses have no known length and are not counted
+    if response.content_length is not None:
+        app_metrics.response_bytes.inc(
+            (mimetype, response.headers.get("Content-Encoding", "identity")),
+            response.content_length,
+        )
+
+
+def compress_response(response: Response) -> None:
+    """Compresses responses that were not served from the response cache."""
+
+    if (
+        response.status_code == HTTPStatus.OK
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+        and (response.content_length or 0) >= app.config["COMPRESS_MIN_SIZE"]
+    ):
+        encoding = request.accept_encodings.best_match(tuple(app_compressors))
+        if encoding:
+            compressed_body = app_compressors[encoding](response.get_data())
+            response.set_data(compressed_body)
+            response.headers.set("Content-Encoding", encoding)
+
+
+def get_metrics() -> Response:
+    """Return the metrics of this process in the Prometheus text format."""
+
+    assert app_metrics is not None, "Metrics are disabled"
+
+    # pylint: disable-next=no-value-for-parameter
+    negotiation = negotiate_mimetype.cache_info()
+    template_files = get_template_files.cache_info()
+    state = app_state
+    datasets = state.datasets
+    triples = (
+        len(datasets.dataset)
+        if isinstance(datasets, LazyDocumentStore)
+        else datasets.triple_count
+    )
+    gauges = {
+        "rdfdp_documents": ("Documents served", len(datasets)),
+        "rdfdp_routes": ("Routes compiled from the documents", len(state.routes)),
+        "rdfdp_triples": ("Triples in the served dataset", triples),
+        "rdfdp_response_cache_bytes": (
+            "Bytes in the response cache",
+            app_responses.size,
+        ),
+        "rdfdp_response_cache_entries": ("Responses cached", len(app_responses)),
+    }
+
+    metrics = list(render_startup_phases())
+
+    for name, (documentation, value) in gauges.items():
+        metrics.extend(format_samples(name, documentation, "gauge", (), {(): value}))
+
+    caches = {
+        "responses": (
+            app_responses.hits,
+            app_responses.misses,
+            app_responses.evictions,
+        ),
+        "negotiation": (negotiation.hits, negotiation.misses, 0),
+        "template_files": (template_files.hits, template_files.misses, 0),
+    }
+
+    if isinstance(datasets, LazyDocumentStore):
+        caches["documents"] = (datasets.hits, datasets.misses, datasets.evictions)
+
+    metrics.extend(render_caches(caches))
+    metrics.extend(app_metrics.render())
+
+    return Response(response="".join(metrics), content_type=METRICS_MIMETYPE)
+
+
+if app_metrics is not None:
+    app.add_url_rule(app.config["METRICS_PATH"], view_func=get_metrics)
+
+
 @app.context_processor
 def handle_context() -> Dict[str, Any]:
     """Add various utility types into the template context."""
@@ -0,0 +1,93 @@
+"""Batches of documents written as one merged graph or as named graphs, assembled
+from the serialized representations of the single documents where possible."""
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Sequence
+from itertools import chain
+
+from rdflib.term import URIRef
+
+from constants import MIMETYPE_FORMATS
+from store import DocumentGraph
+from store import DocumentStore
+from store import DocumentDatasets
+
+# The formats that keep every document of a batch in a graph of its own
+NAMED_GRAPH_MIMETYPE_FORMATS: Dict[str, str] = {
+    "application/trig": "trig",
+    "application/n-quads": "nquads",
+}
+
+# The formats of merged batches in preferential order, followed by the named graph
+# formats
+BATCH_MIMETYPE_FORMATS: Dict[str, str] = {
+    **{m: f for m, f in MIMETYPE_FORMATS.items() if f != "html"},
+    **NAMED_GRAPH_MIMETYPE_FORMATS,
+}
+
+# Accepted batch mimetypes in preferential order
+BATCH_MIMETYPES: Sequence[str] = tuple(BATCH_MIMETYPE_FORMATS.keys())
+
+# Formats whose single documents can be concatenated into a merged batch as they
+# are, since Turtle allows prefix declarations between statements
+CONCATENATED_FORMATS: Tuple[str, ...] = ("nt11", "turtle", "n3")
+
+# The single document mimetypes that named graph formats are assembled from
+NAMED_GRAPH_SOURCE_MIMETYPES: Dict[str, str] = {
+    "trig": "text/turtle",
+    "nquads": "application/n-triples",
+}
+
+
+def split_turtle_prefixes(turtle: bytes) -> Tuple[bytes, bytes]:
+    """Splits Turtle written by the lean writer into its leading prefix
+    declarations and its statements."""
+
+    end = 0
+
+    while turtle.startswith(b"@prefix ", end):
+        end = turtle.index(b"\n", end) + 1
+
+    return turtle[:end], turtle[end:]
+
+
+def to_trig(turtle: bytes, graph_uri: URIRef) -> bytes:
+    """Wraps the statements of a document in Turtle into a TriG graph block, after
+    its prefix declarations."""
+
+    prefixes, statements = split_turtle_prefixes(turtle)
+
+    return b"%s\n%s {%s}\n" % (prefixes, graph_uri.n3().encode("utf-8"), statements)
+
+
+def to_nquads(ntriples: bytes, graph_uri: URIRef) -> bytes:
+    """Adds the graph name to every line of a document in N-Triples."""
+
+    graph_term = b" %s .\n" % graph_uri.n3().encode("utf-8")
+
+    return b"".join(
+        line[:-3] + graph_term for line in ntriples.splitlines(keepends=True)
+    )
+
+
+def merge_documents(
+    document_datasets: DocumentDatasets,
+    document_uris: List[URIRef],
+    batch_uri: URIRef,
+) -> DocumentGraph:
+    """Merges the public triples of the documents into one graph, grouped by
+    subject for serialization, keeping the blank node labels of the documents
+    like the other batch formats do."""
+
+    batch_store = DocumentStore(namespace_manager=document_datasets.namespace_manager)
+    batch_store.add(
+        document_uri=batch_uri,
+        triples=chain.from_iterable(
+            document_datasets.get(u) or () for u in document_uris
+        ),
+        relabel=False,
+    )
+
+    return batch_store[batch_uri]
@@ -0,0 +1,87 @@
+"""Persistent cache of file checksums."""
+
+from os import replace
+from os import stat_result
+from json import load
+from json import dump
+from typing import Dict
+from typing import Iterable
+from pathlib import Path
+from logging import info
+from logging import warning
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import get_file_sha256sum
+
+# Checksums hashed by this process, reused when the files are checked again
+checksum_memo: Dict[str, str] = {}
+
+
+def get_checksum_key(path_stat: stat_result) -> str:
+    """Identifies file contents by inode, size and modification time."""
+    return f"{path_stat.st_ino}-{path_stat.st_size}-{path_stat.st_mtime_ns}"
+
+
+def read_checksum_cache(path: Path) -> Dict[str, str]:
+    """Loads the cached checksums, or nothing when the cache is unusable."""
+
+    try:
+        with open(path, "r", encoding="utf-8") as cache_file:
+            checksums = load(cache_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as ex:
+        warning(f"Ignoring unreadable checksum cache {path}: {ex}")
+        return {}
+
+    return checksums if isinstance(checksums, dict) else {}
+
+
+def write_checksum_cache(path: Path, checksums: Dict[str, str]) -> None:
+    """Stores the checksums, replacing the previous cache file atomically."""
+
+    temporary_path = path.with_name(f"{path.name}.tmp")
+
+    try:
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            dump(checksums, cache_file, sort_keys=True)
+        replace(temporary_path, path)
+    except OSError as ex:
+        warning(f"Unable to write checksum cache {path}: {ex}")
+
+
+def get_file_sha256sums(
+    paths: Iterable[Path],
+    cache_path: Path | None = None,
+    max_workers: int | None = None,
+) -> Dict[Path, str]:
+    """Generates the SHA256 checksums of files, hashing only the changed ones."""
+
+    stored_checksums = read_checksum_cache(path=cache_path) if cache_path else {}
+    cached_checksums = {**stored_checksums, **checksum_memo}
+    checksums: Dict[str, str] = {}
+    path_keys = {path: get_checksum_key(path.stat()) for path in set(paths)}
+    missing_paths = [p for p, k in path_keys.items() if k not in cached_checksums]
+
+    # The hashing releases the GIL, so threads can use multiple cores
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for path, checksum in zip(
+            missing_paths,
+            executor.map(get_file_sha256sum, missing_paths),
+        ):
+            checksums[path_keys[path]] = checksum
+
+    for key in path_keys.values():
+        if key not in checksums:
+            checksums[key] = cached_checksums[key]
+
+    info(f"Hashed {len(missing_paths)} of {len(path_keys)} files")
+
+    checksum_memo.clear()
+    checksum_memo.update(checksums)
+
+    # Only keep the entries of current files to avoid growing the cache forever
+    if cache_path and checksums != stored_checksums:
+        write_checksum_cache(path=cache_path, checksums=checksums)
+
+    return {path: checksums[key] for path, key in path_keys.items()}
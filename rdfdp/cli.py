@@ -0,0 +1,195 @@
+"""Command line interface for preparing the application data ahead of time."""
+
+from os import environ
+from logging import basicConfig
+from logging import INFO
+from pathlib import Path
+from typing import List
+from argparse import ArgumentParser
+from argparse import Namespace
+
+from rdflib.graph import Graph
+
+from constants import SPARQL_FILE_EXTENSIONS
+from resources import get_document_datasets
+from resources import load_data_files
+from resources import add_media_checksums
+from resources import apply_queries
+from snapshot import load_snapshot
+from queries import get_prepared_query
+from queries import format_algebra
+from queries import QueryProfile
+from queries import QueryBudgetError
+from utils import env_to_path
+from utils import find_files
+
+
+def build_snapshot(args: Namespace) -> None:
+    """Prepares the application data and writes it into a snapshot if outdated."""
+
+    if args.path:
+        environ["SNAPSHOT_PATH"] = args.path
+
+    assert environ.get("SNAPSHOT_PATH"), "Undefined snapshot path"
+
+    get_document_datasets()
+
+
+def build_export(args: Namespace) -> None:
+    """Exports every document representation and the nginx configuration."""
+
+    # Importing the application loads the data, so only do it when exporting
+    # pylint: disable-next=import-outside-toplevel
+    from export import export_documents
+
+    export_documents(
+        output_path=Path(args.output),
+        encodings=args.compress.split(",") if args.compress else (),
+        level=args.level,
+        zstd_level=args.zstd_level,
+    )
+
+
+def get_snapshot_dataset(path: Path) -> Graph:
+    """Merges the public and private triples of every document in a snapshot into
+    a dataset, which has the queries applied already."""
+
+    _, document_datasets = load_snapshot(path=path)
+    graph = Graph()
+
+    for prefix, namespace in document_datasets.namespace_manager.namespaces():
+        graph.bind(prefix=prefix, namespace=namespace)
+
+    for document_uri in document_datasets:
+        graph.addN(
+            (s, p, o, graph) for s, p, o in document_datasets.get_private(document_uri)
+        )
+
+    return graph
+
+
+def print_query_profiles(query_profiles: List[QueryProfile]) -> None:
+    """Prints the cost of the applied update queries as a table."""
+
+    print(
+        f"{'query':<40} {'prepare s':>10} {'update s':>10}"
+        f" {'inserted':>10} {'deleted':>10} {'peak MiB':>10}"
+    )
+
+    for query_profile in query_profiles:
+        print(
+            f"{query_profile.path.name:<40}"
+            f" {query_profile.prepare_seconds:>10.3f}"
+            f" {query_profile.update_seconds:>10.3f}"
+            f" {query_profile.inserted:>10}"
+            f" {query_profile.deleted:>10}"
+            f" {(query_profile.peak_memory or 0) / 1024 / 1024:>10.1f}"
+        )
+
+
+def profile_queries(args: Namespace) -> None:
+    """Applies the update queries on the data or a snapshot, and reports their
+    compiled algebra and cost."""
+
+    if args.budget is not None:
+        environ["QUERY_TIME_BUDGET"] = str(args.budget)
+
+    if args.snapshot:
+        graph = get_snapshot_dataset(path=Path(args.snapshot))
+    else:
+        graph = Graph()
+        load_data_files(graph=graph)
+        add_media_checksums(graph=graph)
+
+    if args.explain:
+        for path in find_files(
+            path=env_to_path("QUERIES_PATH"),
+            extensions=SPARQL_FILE_EXTENSIONS,
+        ):
+            algebra = get_prepared_query(path=path, graph=graph).algebra
+            print(f"{path}\n{format_algebra(algebra)}\n")
+
+    try:
+        query_profiles = apply_queries(graph=graph, profile=True)
+    except QueryBudgetError as budget_error:
+        print_query_profiles(query_profiles=budget_error.query_profiles)
+        raise SystemExit(f"Error: {budget_error}") from budget_error
+
+    print_query_profiles(query_profiles=query_profiles)
+
+
+def main() -> None:
+    """Runs the command specified on the command line."""
+
+    basicConfig(
+        format="[%(asctime)s] [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S%z",
+        level=INFO,
+    )
+
+    parser = ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(required=True)
+
+    snapshot_parser = commands.add_parser(
+        "snapshot",
+        help="build the startup snapshot unless it is up to date",
+    )
+    snapshot_parser.add_argument(
+        "--path",
+        help="the snapshot file, instead of the SNAPSHOT_PATH environment variable",
+    )
+    snapshot_parser.set_defaults(command=build_snapshot)
+
+    export_parser = commands.add_parser(
+        "export",
+        help="render every document in every format for serving by a front proxy",
+    )
+    export_parser.add_argument(
+        "--output",
+        required=True,
+        help="the directory to write the documents and nginx configuration into",
+    )
+    export_parser.add_argument(
+        "--compress",
+        help="the comma-separated encodings of pre-compressed siblings: gzip, zstd",
+    )
+    export_parser.add_argument(
+        "--level",
+        type=int,
+        default=9,
+        help="the gzip compression level",
+    )
+    export_parser.add_argument(
+        "--zstd-level",
+        type=int,
+        default=19,
+        help="the zstd compression level",
+    )
+    export_parser.set_defaults(command=build_export)
+
+    queries_parser = commands.add_parser(
+        "queries",
+        help="apply the update queries and report how long each one takes",
+    )
+    queries_parser.add_argument(
+        "--snapshot",
+        help="apply the queries on the data of a snapshot, instead of DATA_PATH",
+    )
+    queries_parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="print the compiled algebra of each query",
+    )
+    queries_parser.add_argument(
+        "--budget",
+        type=float,
+        help="the seconds a query may take, instead of QUERY_TIME_BUDGET",
+    )
+    queries_parser.set_defaults(command=profile_queries)
+
+    args = parser.parse_args()
+    args.command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Response compression helpers."""
+
+from typing import Dict
+from typing import Tuple
+from typing import Callable
+from typing import Iterable
+from gzip import compress as gzip_compress
+from zlib import compress as zlib_compress
+from logging import debug
+from functools import partial
+
+try:
+    from compression.zstd import compress as zstd_compress
+except ImportError:
+    try:
+        from zstandard import compress as zstd_compress
+    except ImportError:
+        zstd_compress = None  # pylint: disable=invalid-name
+
+# The content encodings that can be produced, in preferential order
+SUPPORTED_ENCODINGS: Tuple[str, ...] = (
+    ("zstd", "gzip", "deflate") if zstd_compress else ("gzip", "deflate")
+)
+
+
+def get_compressors(
+    algorithms: Iterable[str],
+    level: int,
+    zstd_level: int,
+) -> Dict[str, Callable[[bytes], bytes]]:
+    """Creates compression functions for the supported algorithms, in order."""
+
+    compressors: Dict[str, Callable[[bytes], bytes]] = {}
+
+    for algorithm in algorithms:
+        if algorithm == "zstd" and zstd_compress:
+            compressors[algorithm] = partial(zstd_compress, level=zstd_level)
+        elif algorithm == "gzip":
+            compressors[algorithm] = partial(
+                gzip_compress,
+                compresslevel=level,
+                mtime=0,
+            )
+        elif algorithm == "deflate":
+            compressors[algorithm] = partial(zlib_compress, level=level)
+        else:
+            debug(f"Ignoring unsupported compression algorithm {algorithm}")
+
+    return compressors
+
+
+def compress_variants(
+    body: bytes,
+    compressors: Dict[str, Callable[[bytes], bytes]],
+) -> Dict[str, bytes]:
+    """Compresses the body with every compressor, keeping only the smaller ones."""
+
+    variants: Dict[str, bytes] = {}
+
+    for encoding, compressor in compressors.items():
+        compressed_body = compressor(body)
+        if len(compressed_body) < len(body):
+            variants[encoding] = compressed_body
+
+    return variants
@@ -1,5 +1,6 @@
 """Constant values used within the application."""
 
+from typing import Any
 from typing import Set
 from typing import Dict
 from typing import Sequence
@@ -54,6 +55,9 @@ SPARQL_FILE_EXTENSIONS: Set[str] = set((".rq", ".sparql"))
 # Set of predicates to load object data directly into from a local file
 CONTENT_EMBED_PREDICATES: Set[URIRef] = set((SDO.articleBody, SDO.text))
 
+# Configuration values that are interpreted as enabling an option
+CONFIG_TRUE_VALUES: Sequence[Any] = ("true", "True", True, 1, "1")
+
 # The date format used for xsd:dateTime
 XSD_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
@@ -78,3 +82,7 @@ CUSTOM_MIMETYPES: Dict[str, str] = {
     "font/woff2": ".woff2",
     **ADDITIONAL_MIMETYPES,
 }
+
+# The path of the dataset dump on every host, and the mimetype it is served as
+DUMP_URI_PATH = "/dump.nt.gz"
+DUMP_MIMETYPE = "application/gzip"
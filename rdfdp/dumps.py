@@ -0,0 +1,149 @@
+"""Compressed N-Triples dumps of the public data of every host, for bulk downloads."""
+
+from os import getpid
+from os import replace
+from gzip import GzipFile
+from typing import Dict
+from typing import List
+from typing import Iterable
+from pathlib import Path
+from logging import info
+from datetime import datetime
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+
+from rdflib.term import URIRef
+from rdflib.term import Literal
+from rdflib.graph import _TripleType
+from rdflib.namespace import RDF
+from rdflib.namespace import SDO
+from rdflib.namespace import VOID
+
+from constants import DUMP_URI_PATH
+from constants import DUMP_MIMETYPE
+from serializers import iter_chunks
+from serializers import iter_ntriples
+from serializers import STREAM_CHUNK_SIZE
+from store import DocumentDatasets
+
+# The gzip compression level of the dumps, which are compressed once per change
+DUMP_COMPRESS_LEVEL = 9
+
+# The VoID feature advertising the serialization of the dumps
+NTRIPLES_FORMAT = URIRef("http://www.w3.org/ns/formats/N-Triples")
+
+
+def get_dataset_uri(uri: str) -> URIRef:
+    """Returns the URI of the per-host dataset that a document belongs to."""
+
+    return URIRef(urljoin(base=uri, url="/", allow_fragments=False))
+
+
+def get_dump_uri(dataset_uri: URIRef) -> URIRef:
+    """Returns the URI the dump of a dataset is served at."""
+
+    return URIRef(urljoin(base=dataset_uri, url=DUMP_URI_PATH))
+
+
+def get_dump_file(dump_path: Path, dataset_uri: URIRef) -> Path:
+    """Returns the file the dump of a dataset is written into."""
+
+    parsed_uri = urlparse(dataset_uri)
+    netloc = parsed_uri.netloc.replace(":", "_")
+
+    return dump_path.joinpath(f"{parsed_uri.scheme}_{netloc}.nt.gz")
+
+
+def generate_dump_triples(dataset_uri: URIRef, dump_path: Path) -> List[_TripleType]:
+    """Generates the triples advertising the dump of a dataset in its VoID
+    description, and describing the dump as a file served from disk."""
+
+    dump_uri = get_dump_uri(dataset_uri)
+    dump_file = get_dump_file(dump_path=dump_path, dataset_uri=dataset_uri)
+
+    return [
+        (dataset_uri, VOID.dataDump, dump_uri),
+        (dataset_uri, VOID.feature, NTRIPLES_FORMAT),
+        (dump_uri, RDF.type, SDO.MediaObject),
+        (dump_uri, SDO.encodingFormat, Literal(DUMP_MIMETYPE)),
+        (dump_uri, SDO.contentUrl, URIRef(dump_file.absolute().as_uri())),
+    ]
+
+
+def group_documents_by_dataset(
+    document_uris: Iterable[URIRef],
+) -> Dict[URIRef, List[URIRef]]:
+    """Groups document URIs by the per-host datasets they belong to, in order."""
+
+    datasets: Dict[URIRef, List[URIRef]] = {}
+
+    for document_uri in document_uris:
+        datasets.setdefault(get_dataset_uri(document_uri), []).append(document_uri)
+
+    return datasets
+
+
+def write_dump(
+    dump_file: Path,
+    document_datasets: DocumentDatasets,
+    document_uris: Iterable[URIRef],
+) -> int:
+    """Writes the public triples of the documents into a gzipped N-Triples file,
+    replacing any previous dump at once, and returns the number of triples."""
+
+    # Write into a file of this process first, as every worker may be writing
+    temporary_file = dump_file.with_name(f"{dump_file.name}.{getpid()}.tmp")
+    triple_count = 0
+
+    # Leave the timestamp out, so that unchanged data yields identical dumps
+    with GzipFile(
+        filename=temporary_file,
+        mode="wb",
+        compresslevel=DUMP_COMPRESS_LEVEL,
+        mtime=0,
+    ) as gzip_file:
+        for document_uri in document_uris:
+            document_graph = document_datasets.get(document_uri)
+            if document_graph is None:
+                continue
+            triple_count += len(document_graph)
+            for chunk in iter_chunks(
+                iter_ntriples(document_graph), chunk_size=STREAM_CHUNK_SIZE
+            ):
+                gzip_file.write(chunk)
+
+    replace(temporary_file, dump_file)
+
+    return triple_count
+
+
+def write_dumps(
+    document_datasets: DocumentDatasets,
+    dump_path: Path,
+    files_modified: datetime | None = None,
+    dataset_uris: Iterable[URIRef] | None = None,
+) -> None:
+    """Writes the dumps of the given datasets, or of all of them, skipping dumps
+    written after the latest change to the input files when it is given."""
+
+    dump_path.mkdir(parents=True, exist_ok=True)
+    datasets = group_documents_by_dataset(document_datasets)
+
+    for dataset_uri in datasets if dataset_uris is None else dataset_uris:
+        dump_file = get_dump_file(dump_path=dump_path, dataset_uri=dataset_uri)
+
+        if (
+            files_modified is not None
+            and dump_file.is_file()
+            and dump_file.stat().st_mtime >= files_modified.timestamp()
+        ):
+            info(f"Dump of {dataset_uri.n3()} at {dump_file} is up to date")
+            continue
+
+        triple_count = write_dump(
+            dump_file=dump_file,
+            document_datasets=document_datasets,
+            document_uris=datasets.get(dataset_uri, ()),
+        )
+
+        info(f"Wrote dump of {triple_count} triples for {dataset_uri.n3()}")
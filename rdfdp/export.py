@@ -0,0 +1,253 @@
+"""Static export of every document representation for serving by a front proxy."""
+
+from os import link
+from http import HTTPStatus
+from typing import Dict
+from typing import Callable
+from typing import Iterable
+from shutil import copyfile
+from pathlib import Path
+from logging import info
+from logging import warning
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+from flask.testing import FlaskClient
+
+from rdflib.term import URIRef
+
+from app import app
+from app import app_state
+from compressors import get_compressors
+from compressors import compress_variants
+from constants import ACCEPT_MIMETYPES
+
+# The file extensions of the exported representations, in negotiation order
+EXPORT_EXTENSIONS: Dict[str, str] = {
+    "text/turtle": "ttl",
+    "text/plain": "txt",
+    "text/html": "html",
+    "text/n3": "n3",
+    "application/ld+json": "jsonld",
+    "application/n-triples": "nt",
+    "application/rdf+xml": "rdf",
+}
+
+# The file extensions of pre-compressed siblings, as expected by nginx modules
+ENCODING_EXTENSIONS: Dict[str, str] = {"gzip": "gz", "zstd": "zst"}
+
+# The name of the representation served when the client expresses no preference
+DEFAULT_EXTENSION = EXPORT_EXTENSIONS[ACCEPT_MIMETYPES[0]]
+
+# The directory name used for hosts that were not exported
+UNKNOWN_HOST = "_"
+
+# The file name tried for documents without media, which never exists
+UNKNOWN_MEDIA = "_"
+
+# The directory tried for Accept headers that only the application can negotiate,
+# which never exists
+NEGOTIATED_DIRECTORY = "/.rdfdp"
+
+# The Accept headers that express no preference, for which the media file or the
+# default representation is served like the application does
+ANY_ACCEPT_HEADERS = ("", "*/*")
+
+
+def get_export_directory(output_path: Path, document_uri: URIRef) -> Path:
+    """Maps a document URI to the directory holding its representations."""
+
+    parsed_uri = urlparse(document_uri)
+
+    return output_path.joinpath(
+        parsed_uri.netloc,
+        unquote(parsed_uri.path).strip("/"),
+    )
+
+
+def write_file(
+    path: Path,
+    body: bytes,
+    compressors: Dict[str, Callable[[bytes], bytes]],
+) -> None:
+    """Writes a file along with its smaller pre-compressed siblings."""
+
+    path.write_bytes(body)
+
+    for encoding, encoded_body in compress_variants(body, compressors).items():
+        path.with_name(f"{path.name}.{ENCODING_EXTENSIONS[encoding]}").write_bytes(
+            encoded_body
+        )
+
+
+def link_file(source_path: Path, path: Path) -> None:
+    """Hard links a file into the export, or copies it across file systems."""
+
+    path.unlink(missing_ok=True)
+
+    try:
+        link(source_path, path)
+    except OSError:
+        copyfile(source_path, path)
+
+
+def get_nginx_map(
+    variable: str,
+    source: str,
+    default: str,
+    values: Dict[str, str],
+) -> str:
+    """Generates an nginx map block, with the keys and values quoted."""
+
+    lines = [f"map {source} ${variable} {{", f'    default "{default}";']
+    lines.extend(f'    "{k}" "{v}";' for k, v in values.items())
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_nginx_config(
+    output_path: Path,
+    hosts: Dict[str, str],
+    media: Dict[str, str],
+    redirects: Dict[str, str],
+) -> None:
+    """Writes the nginx maps for the http context, and the location for servers,
+    which falls back to a @rdfdp location proxying the application on misses."""
+
+    # Only Accept headers of exactly one mimetype select a file, as nginx cannot
+    # weigh quality values and the order of preference, so headers with several
+    # mimetypes, quality values or parameters are negotiated by the application
+    accept_extensions = {m: EXPORT_EXTENSIONS[m] for m in ACCEPT_MIMETYPES}
+    fallback_directories = {h: "" for h in ANY_ACCEPT_HEADERS}
+
+    maps = "\n".join(
+        (
+            "# Generated by rdfdp export, include in the http context\n",
+            get_nginx_map("rdfdp_host", "$http_host", UNKNOWN_HOST, hosts),
+            get_nginx_map("rdfdp_extension", "$http_accept", "", accept_extensions),
+            get_nginx_map(
+                "rdfdp_fallback",
+                "$http_accept",
+                NEGOTIATED_DIRECTORY,
+                fallback_directories,
+            ),
+            get_nginx_map("rdfdp_media", "$http_host$uri", UNKNOWN_MEDIA, media),
+            get_nginx_map("rdfdp_redirect", "$http_host$uri", "", redirects),
+        )
+    )
+    output_path.joinpath("nginx-maps.conf").write_text(maps, encoding="utf-8")
+
+    types = "".join(f"        {m} {e};\n" for m, e in EXPORT_EXTENSIONS.items())
+    location = (
+        "# Generated by rdfdp export, include in the server context\n\n"
+        "location / {\n"
+        "    if ($rdfdp_redirect) {\n"
+        "        return 307 $rdfdp_redirect;\n"
+        "    }\n"
+        f"    root {output_path.absolute().as_posix()};\n"
+        "    types {\n"
+        f"{types}"
+        "    }\n"
+        "    default_type application/octet-stream;\n"
+        "    add_header Vary Accept always;\n"
+        "    gzip_static on;\n"
+        "    # Exactly one mimetype selects its file, no preference selects the media\n"
+        "    # file or the default representation, and anything else goes to @rdfdp\n"
+        "    try_files\n"
+        "        /$rdfdp_host$uri/index.$rdfdp_extension\n"
+        "        /$rdfdp_host$uri$rdfdp_fallback/$rdfdp_media\n"
+        f"        /$rdfdp_host$uri$rdfdp_fallback/index.{DEFAULT_EXTENSION}\n"
+        "        @rdfdp;\n"
+        "}\n"
+    )
+    output_path.joinpath("nginx-location.conf").write_text(location, encoding="utf-8")
+
+
+def export_media(media_path: str, directory: Path) -> str:
+    """Links the on-disk file of a schema:MediaObject, and returns its file name."""
+
+    file_path = Path(media_path)
+    file_name = f"media{file_path.suffix}"
+    link_file(file_path, directory.joinpath(file_name))
+
+    return file_name
+
+
+def export_representations(
+    document_uri: URIRef,
+    directory: Path,
+    client: FlaskClient,
+    compressors: Dict[str, Callable[[bytes], bytes]],
+    skip_mimetype: str | None = None,
+) -> None:
+    """Requests a document in every format from the application, so that the
+    exported files match the responses exactly, and writes them into files."""
+
+    parsed_uri = urlparse(document_uri)
+
+    for mimetype, extension in EXPORT_EXTENSIONS.items():
+        if mimetype == skip_mimetype:
+            continue
+        response = client.get(
+            parsed_uri.path,
+            base_url=f"{parsed_uri.scheme}://{parsed_uri.netloc}",
+            headers={"Accept": mimetype},
+        )
+        if response.status_code == HTTPStatus.OK:
+            write_file(
+                directory.joinpath(f"index.{extension}"),
+                body=response.get_data(),
+                compressors=compressors,
+            )
+        elif response.status_code != HTTPStatus.NOT_ACCEPTABLE:
+            warning(
+                f"Unable to export {document_uri.n3()} as {mimetype}:"
+                f" {response.status}"
+            )
+
+
+def export_documents(
+    output_path: Path,
+    encodings: Iterable[str],
+    level: int,
+    zstd_level: int,
+) -> None:
+    """Renders every document in every available representation into files."""
+
+    compressors = get_compressors(encodings, level=level, zstd_level=zstd_level)
+    client = app.test_client()
+    hosts: Dict[str, str] = {}
+    media: Dict[str, str] = {}
+    redirects: Dict[str, str] = {}
+
+    routes = app_state.routes
+
+    # The routes hold the redirects and media files without exposing the file URIs
+    for route in routes.values():
+        parsed_uri = urlparse(route.document_uri)
+        request_uri = f"{parsed_uri.netloc}{unquote(parsed_uri.path)}"
+        hosts[parsed_uri.netloc] = parsed_uri.netloc
+
+        if route.redirect:
+            redirects[request_uri] = route.redirect
+            continue
+
+        directory = get_export_directory(output_path, route.document_uri)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        if route.media_path:
+            media[request_uri] = export_media(route.media_path, directory)
+
+        export_representations(
+            document_uri=route.document_uri,
+            directory=directory,
+            client=client,
+            compressors=compressors,
+            # The on-disk file is the representation of its own mimetype
+            skip_mimetype=route.media_mimetype,
+        )
+
+    write_nginx_config(output_path, hosts=hosts, media=media, redirects=redirects)
+
+    info(f"Exported {len(routes)} documents into {output_path}")
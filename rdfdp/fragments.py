@@ -0,0 +1,342 @@
+"""Triple Pattern Fragments over the public triples of all documents."""
+
+from re import DOTALL
+from re import compile as re_compile
+from array import array
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Iterable
+from typing import Iterator
+from itertools import chain
+from itertools import islice
+from urllib.parse import urlencode
+
+from rdflib.term import Node
+from rdflib.term import BNode
+from rdflib.term import URIRef
+from rdflib.term import Literal
+from rdflib.graph import _TripleType
+from rdflib.namespace import RDF
+from rdflib.namespace import XSD
+from rdflib.namespace import VOID
+from rdflib.namespace import Namespace
+from rdflib.namespace import NamespaceManager
+
+from constants import ACCEPT_MIMETYPES
+from store import TermTable
+from store import DocumentGraph
+from store import DocumentStore
+from store import DocumentDatasets
+from store import TERM_ID_TYPECODE
+from store import get_namespace_manager
+from store import _TriplePatternType
+from utils import is_private_triple
+
+# The Hydra vocabulary of the hypermedia controls
+HYDRA = Namespace("http://www.w3.org/ns/hydra/core#")
+
+# The array type code of triple numbers in the indexes, allowing for up to four
+# billion triples
+TRIPLE_NUMBER_TYPECODE = "I"
+
+# The number of candidate triples up to which patterns with several bound terms are
+# counted exactly, above which their count is estimated from the smallest index
+EXACT_COUNT_CANDIDATES = 10000
+
+# The mimetypes fragments are served in, as there is no template for them
+FRAGMENT_MIMETYPES: Tuple[str, ...] = tuple(
+    m for m in ACCEPT_MIMETYPES if m != "text/html"
+)
+
+# The query parameters selecting the terms of the pattern, in triple order
+PATTERN_PARAMETERS: Tuple[str, str, str] = ("subject", "predicate", "object")
+
+# Literals in the explicit representation of Hydra, with a language or datatype
+EXPLICIT_LITERAL = re_compile(r'"(.*)"(?:@([A-Za-z0-9-]+)|\^\^(.+))?', DOTALL)
+
+
+def parse_term(value: str | None) -> Node | None:
+    """Parses a term in the explicit representation of Hydra, or returns None for
+    variables and missing values, which match any term."""
+
+    if not value or value.startswith("?"):
+        return None
+
+    literal_match = EXPLICIT_LITERAL.fullmatch(value)
+
+    if literal_match:
+        lexical, language, datatype = literal_match.groups()
+        return Literal(
+            lexical,
+            lang=language,
+            datatype=URIRef(datatype) if datatype else None,
+        )
+
+    if value.startswith("_:"):
+        return BNode(value[2:])
+
+    return URIRef(value)
+
+
+def format_term(term: Node | None) -> str | None:
+    """Writes a term in the explicit representation of Hydra."""
+
+    if term is None:
+        return None
+
+    if isinstance(term, Literal):
+        if term.language:
+            return f'"{term}"@{term.language}'
+        if term.datatype:
+            return f'"{term}"^^{term.datatype}'
+        return f'"{term}"'
+
+    return term.n3() if isinstance(term, BNode) else str(term)
+
+
+class FragmentIndex:
+    """The triples of all documents as one array of term IDs, with the numbers of
+    the triples of every subject, predicate and object indexed, so that pages of
+    any pattern are read from the smallest matching index instead of scanning."""
+
+    def __init__(
+        self,
+        namespace_manager: NamespaceManager,
+        term_table: TermTable,
+        triple_ids: array,
+    ) -> None:
+        self.namespace_manager = get_namespace_manager(
+            (*namespace_manager.namespaces(), ("hydra", HYDRA), ("void", VOID))
+        )
+        self.term_table = term_table
+        self.triple_ids = triple_ids
+        self.indexes: Tuple[Dict[int, array], ...] = ({}, {}, {})
+
+        for offset, term_id in enumerate(triple_ids):
+            index = self.indexes[offset % 3]
+            triple_numbers = index.get(term_id)
+            if triple_numbers is None:
+                triple_numbers = index[term_id] = array(TRIPLE_NUMBER_TYPECODE)
+            triple_numbers.append(offset // 3)
+
+    def __len__(self) -> int:
+        return len(self.triple_ids) // 3
+
+    def get_candidates(
+        self, pattern: _TriplePatternType
+    ) -> Tuple[Iterable[int], List[Tuple[int, int]]]:
+        """Returns the numbers of the triples in the smallest index of the bound
+        terms, and the positions and IDs of the bound terms left to check."""
+
+        ids = self.term_table.ids
+        bound = [
+            (position, ids.get(term, -1))
+            for position, term in enumerate(pattern)
+            if term is not None
+        ]
+
+        # Terms that were never interned cannot match any triple
+        if any(term_id == -1 for _, term_id in bound):
+            return (), []
+
+        if not bound:
+            return range(len(self)), []
+
+        indexed = min(
+            bound, key=lambda b: len(self.indexes[b[0]].get(b[1], ()))  # type: ignore
+        )
+        candidates = self.indexes[indexed[0]].get(indexed[1], ())
+
+        return candidates, [b for b in bound if b != indexed]
+
+    def check_candidates(
+        self, candidates: Iterable[int], checks: List[Tuple[int, int]]
+    ) -> Iterable[int]:
+        """Filters the candidate triple numbers by the bound terms left to check."""
+
+        if not checks:
+            return candidates
+
+        triple_ids = self.triple_ids
+
+        return (
+            n for n in candidates if all(triple_ids[n * 3 + p] == t for p, t in checks)
+        )
+
+    def count(self, pattern: _TriplePatternType) -> Tuple[int, bool]:
+        """Counts the matching triples, and whether the count is exact, which it is
+        unless too many candidates of the smallest index are left to check, whose
+        number is then an upper bound."""
+
+        candidates, checks = self.get_candidates(pattern)
+
+        if checks and len(candidates) <= EXACT_COUNT_CANDIDATES:  # type: ignore
+            return sum(1 for _ in self.check_candidates(candidates, checks)), True
+
+        return len(candidates), not checks  # type: ignore[arg-type]
+
+    def triples(
+        self,
+        pattern: _TriplePatternType,
+        offset: int = 0,
+        limit: int | None = None,
+    ) -> Iterator[_TripleType]:
+        """Generates a page of the triples matching the pattern, in the order of the
+        documents."""
+
+        candidates, checks = self.get_candidates(pattern)
+        candidates = self.check_candidates(candidates, checks)
+        triple_ids = self.triple_ids
+        terms = self.term_table.terms
+        stop = None if limit is None else offset + limit
+
+        for n in islice(candidates, offset, stop):
+            s, p, o = triple_ids[n * 3 : n * 3 + 3]
+            yield terms[s], terms[p], terms[o]  # type: ignore[misc]
+
+
+def create_fragment_index(document_datasets: DocumentDatasets) -> FragmentIndex:
+    """Indexes the public triples of all documents, sharing the term table of the
+    compact store, or interning the dataset anew when documents are collected
+    lazily."""
+
+    triple_ids = array(TERM_ID_TYPECODE)
+
+    if isinstance(document_datasets, DocumentStore):
+        for document_ids in document_datasets.documents.values():
+            triple_ids.extend(document_ids)
+        term_table = document_datasets.term_table
+    else:
+        term_table = TermTable()
+        intern = term_table.intern
+        for triple in document_datasets.dataset:
+            if not is_private_triple(triple):
+                triple_ids.extend(intern(t) for t in triple)
+
+    return FragmentIndex(
+        namespace_manager=document_datasets.namespace_manager,
+        term_table=term_table,
+        triple_ids=triple_ids,
+    )
+
+
+def get_fragment_uri(base_uri: str, pattern: _TriplePatternType, page: int) -> URIRef:
+    """Returns the URI of a page of the fragment of a pattern."""
+
+    parameters = [
+        (name, format_term(term))
+        for name, term in zip(PATTERN_PARAMETERS, pattern)
+        if term is not None
+    ]
+
+    if page > 1:
+        parameters.append(("page", str(page)))
+
+    return URIRef(f"{base_uri}?{urlencode(parameters)}" if parameters else base_uri)
+
+
+def get_control_triples(
+    base_uri: str,
+    page_uri: URIRef,
+) -> Iterator[_TripleType]:
+    """Generates the hypermedia controls of the dataset, for requesting the
+    fragments of other patterns, with fixed blank node labels that differ from
+    the labels of stored blank nodes."""
+
+    dataset_uri = URIRef(f"{base_uri}#dataset")
+    search = BNode("hydraSearch")
+
+    yield dataset_uri, RDF.type, VOID.Dataset
+    yield dataset_uri, RDF.type, HYDRA.Collection
+    yield dataset_uri, VOID.subset, page_uri
+    yield dataset_uri, HYDRA.search, search
+    yield search, HYDRA.template, Literal(
+        f"{base_uri}{{?{','.join(PATTERN_PARAMETERS)}}}"
+    )
+    yield search, HYDRA.variableRepresentation, HYDRA.ExplicitRepresentation
+
+    for name, term_property in zip(
+        PATTERN_PARAMETERS, (RDF.subject, RDF.predicate, RDF.object)
+    ):
+        mapping = BNode(f"hydra{name.capitalize()}Mapping")
+        yield search, HYDRA.mapping, mapping
+        yield mapping, HYDRA.variable, Literal(name)
+        yield mapping, HYDRA.property, term_property
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def get_page_triples(
+    base_uri: str,
+    pattern: _TriplePatternType,
+    page: int,
+    page_size: int,
+    total: int,
+    exact: bool,
+    has_next: bool,
+) -> Iterator[_TripleType]:
+    """Generates the metadata of a page of a fragment, with the total count, and
+    the controls for paging, linking the last page only when the count is exact."""
+
+    page_uri = get_fragment_uri(base_uri, pattern, page=page)
+
+    yield page_uri, RDF.type, HYDRA.PartialCollectionView
+    yield page_uri, VOID.triples, Literal(total, datatype=XSD.integer)
+    yield page_uri, HYDRA.totalItems, Literal(total, datatype=XSD.integer)
+    yield page_uri, HYDRA.itemsPerPage, Literal(page_size, datatype=XSD.integer)
+    yield page_uri, HYDRA.first, get_fragment_uri(base_uri, pattern, page=1)
+
+    if exact:
+        pages = max((total + page_size - 1) // page_size, 1)
+        yield page_uri, HYDRA.last, get_fragment_uri(base_uri, pattern, page=pages)
+
+    if page > 1:
+        yield page_uri, HYDRA.previous, get_fragment_uri(base_uri, pattern, page - 1)
+
+    if has_next:
+        yield page_uri, HYDRA.next, get_fragment_uri(base_uri, pattern, page + 1)
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def get_fragment_page(
+    fragment_index: FragmentIndex,
+    base_uri: str,
+    pattern: _TriplePatternType,
+    page: int,
+    page_size: int,
+) -> DocumentGraph:
+    """Builds a page of the fragment of a pattern, with its data followed by its
+    metadata and controls, grouped by subject for serialization. The blank nodes
+    keep their stored labels, so that they can be used in the patterns of
+    further requests."""
+
+    page_uri = get_fragment_uri(base_uri, pattern, page=page)
+    total, exact = fragment_index.count(pattern)
+
+    # Read one triple past the page to know whether a next page exists
+    page_data = list(
+        fragment_index.triples(
+            pattern, offset=(page - 1) * page_size, limit=page_size + 1
+        )
+    )
+
+    page_store = DocumentStore(namespace_manager=fragment_index.namespace_manager)
+    page_store.add(
+        document_uri=page_uri,
+        triples=chain(
+            page_data[:page_size],
+            get_page_triples(
+                base_uri=base_uri,
+                pattern=pattern,
+                page=page,
+                page_size=page_size,
+                total=total,
+                exact=exact,
+                has_next=len(page_data) > page_size,
+            ),
+            get_control_triples(base_uri=base_uri, page_uri=page_uri),
+        ),
+        relabel=False,
+    )
+
+    return page_store[page_uri]
@@ -0,0 +1,27 @@
+"""Gunicorn configuration for sharing the prepared data between workers."""
+
+from os import environ
+from gc import freeze
+
+# Load the application once in the master process, so that the workers share the
+# prepared data as copy-on-write memory instead of each building their own copy
+preload_app = True  # pylint: disable=invalid-name
+
+# Defer the background threads of the application until the workers are forked
+environ.setdefault("FLASK_PRELOAD", "true")
+
+
+def pre_fork(server, worker):  # pylint: disable=unused-argument
+    """Moves the loaded objects out of reach of the garbage collector before forking,
+    so that collections in the workers do not write into the shared memory pages."""
+
+    freeze()
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Starts the background threads of the application within each worker."""
+
+    # pylint: disable-next=import-outside-toplevel
+    from app import start_background_tasks
+
+    start_background_tasks()
@@ -0,0 +1,248 @@
+"""Collection of startup and request metrics in the Prometheus text format."""
+
+from time import perf_counter
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+from threading import Lock
+from contextlib import contextmanager
+
+# The mimetype of the Prometheus text exposition format
+METRICS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The upper bounds in seconds of the request stage duration buckets
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+# The label values of a sample, in the order of the label names of its metric
+LabelValues = Tuple[str, ...]
+
+# The durations of the startup phases in seconds, from their latest run
+startup_phases: Dict[str, float] = {}
+
+
+@contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """Records the duration of a startup phase, which is cheap enough to always do."""
+
+    start = perf_counter()
+
+    try:
+        yield
+    finally:
+        startup_phases[name] = perf_counter() - start
+
+
+def escape_label_value(value: str) -> str:
+    """Escapes a label value for the text format."""
+
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names: Iterable[str], label_values: Iterable[str]) -> str:
+    """Formats the labels of a sample, or nothing when there are none."""
+
+    labels = ",".join(
+        f'{n}="{escape_label_value(v)}"' for n, v in zip(label_names, label_values)
+    )
+
+    return f"{{{labels}}}" if labels else ""
+
+
+def format_samples(
+    name: str,
+    documentation: str,
+    kind: str,
+    label_names: Tuple[str, ...],
+    samples: Dict[LabelValues, float],
+) -> Iterator[str]:
+    """Formats a counter or gauge with its samples."""
+
+    yield f"# HELP {name} {documentation}\n"
+    yield f"# TYPE {name} {kind}\n"
+
+    for label_values, value in samples.items():
+        yield f"{name}{format_labels(label_names, label_values)} {value}\n"
+
+
+class Counter:
+    """Counter with labels, summed across threads."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...],
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values: Dict[LabelValues, float] = {}
+        self._lock = Lock()
+
+    def inc(self, label_values: LabelValues, amount: float = 1) -> None:
+        """Increments the counter of the label values."""
+
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        """Formats the counter in the text format."""
+
+        with self._lock:
+            values = dict(self.values)
+
+        yield from format_samples(
+            self.name, self.documentation, "counter", self.label_names, values
+        )
+
+
+class Histogram:
+    """Histogram with labels and cumulative buckets, summed across threads."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...],
+        buckets: Tuple[float, ...] = DURATION_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # Per label values, the bucket counts followed by the total count and sum
+        self.values: Dict[LabelValues, List[float]] = {}
+        self._lock = Lock()
+
+    def observe(self, label_values: LabelValues, value: float) -> None:
+        """Adds an observation to the first bucket it fits into."""
+
+        index = next(
+            (i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets)
+        )
+
+        with self._lock:
+            values = self.values.get(label_values)
+            if values is None:
+                values = self.values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                values[index] += 1
+            values[-2] += 1
+            values[-1] += value
+
+    def render(self) -> Iterator[str]:
+        """Formats the histogram in the text format, with cumulative buckets."""
+
+        with self._lock:
+            values = {k: list(v) for k, v in self.values.items()}
+
+        yield f"# HELP {self.name} {self.documentation}\n"
+        yield f"# TYPE {self.name} histogram\n"
+
+        for label_values, counts in values.items():
+            labels = format_labels(self.label_names, label_values)
+            bucket_labels = labels[:-1] + "," if labels else "{"
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{bucket_labels}le="{bucket}"}} {cumulative}\n'
+            yield f'{self.name}_bucket{bucket_labels}le="+Inf"}} {counts[-2]}\n'
+            yield f"{self.name}_count{labels} {counts[-2]}\n"
+            yield f"{self.name}_sum{labels} {counts[-1]}\n"
+
+
+class RequestMetrics(NamedTuple):
+    """The metrics collected from requests."""
+
+    stages: Histogram
+    requests: Counter
+    response_bytes: Counter
+
+    def render(self) -> Iterator[str]:
+        """Formats all request metrics in the text format."""
+
+        for metric in (self.stages, self.requests, self.response_bytes):
+            yield from metric.render()
+
+
+def create_request_metrics() -> RequestMetrics:
+    """Creates empty request metrics."""
+
+    return RequestMetrics(
+        stages=Histogram(
+            "rdfdp_request_stage_seconds",
+            "Time spent in each stage of answering document requests",
+            ("mimetype", "stage"),
+        ),
+        requests=Counter(
+            "rdfdp_requests_total",
+            "Document requests answered, by status code",
+            ("mimetype", "status"),
+        ),
+        response_bytes=Counter(
+            "rdfdp_response_bytes_total",
+            "Response body bytes with a known length, by content encoding",
+            ("mimetype", "encoding"),
+        ),
+    )
+
+
+def render_startup_phases() -> Iterator[str]:
+    """Formats the startup phase durations in the text format."""
+
+    yield from format_samples(
+        "rdfdp_startup_phase_seconds",
+        "Duration of the latest run of each phase of preparing the data",
+        "gauge",
+        ("phase",),
+        {(name,): duration for name, duration in startup_phases.items()},
+    )
+
+
+def render_caches(caches: Dict[str, Tuple[int, int, int]]) -> Iterator[str]:
+    """Formats the hits, misses and evictions of caches by name in the text
+    format, together with their hit ratios."""
+
+    label_names = ("cache",)
+
+    for metric, kind, documentation, index in (
+        ("rdfdp_cache_hits_total", "counter", "Cache lookups that hit", 0),
+        ("rdfdp_cache_misses_total", "counter", "Cache lookups that missed", 1),
+        ("rdfdp_cache_evictions_total", "counter", "Entries evicted from caches", 2),
+    ):
+        yield from format_samples(
+            metric,
+            documentation,
+            kind,
+            label_names,
+            {(name,): values[index] for name, values in caches.items()},
+        )
+
+    yield from format_samples(
+        "rdfdp_cache_hit_ratio",
+        "Share of cache lookups that hit since startup",
+        "gauge",
+        label_names,
+        {
+            (name,): hits / (hits + misses) if hits + misses else 0
+            for name, (hits, misses, _) in caches.items()
+        },
+    )
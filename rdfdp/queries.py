@@ -0,0 +1,166 @@
+"""Preparation, application and profiling of the SPARQL update queries."""
+
+from time import perf_counter
+from typing import Any
+from typing import Set
+from typing import List
+from typing import Tuple
+from typing import NamedTuple
+from pathlib import Path
+from logging import error
+from functools import lru_cache
+from threading import Timer
+from tracemalloc import start as start_tracing
+from tracemalloc import stop as stop_tracing
+from tracemalloc import get_traced_memory
+
+from rdflib.term import Node
+from rdflib.graph import Graph
+from rdflib.graph import _TripleType
+from rdflib.plugins.sparql.sparql import Update
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.processor import prepareUpdate
+
+# The number of prepared queries to keep, for reapplying them on reloads
+QUERY_CACHE_SIZE = 256
+
+# The namespaces bound when a query is prepared, which resolve its prefixes
+Namespaces = Tuple[Tuple[str, str], ...]
+
+
+class QueryProfile(NamedTuple):
+    """The cost of applying one update query, with the exact changes and memory
+    use only known when profiled."""
+
+    path: Path
+    prepare_seconds: float
+    update_seconds: float
+    triples_before: int
+    triples_after: int
+    inserted: int | None = None
+    deleted: int | None = None
+    peak_memory: int | None = None
+
+
+class QueryBudgetError(RuntimeError):
+    """Raised once an update query has completed over the time budget, carrying the
+    profiles of the queries applied so far, the slow one included."""
+
+    def __init__(self, message: str, query_profiles: List[QueryProfile]) -> None:
+        super().__init__(message)
+        self.query_profiles = query_profiles
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def prepare_query(
+    path: Path,
+    modified: int,  # pylint: disable=unused-argument
+    namespaces: Namespaces,
+) -> Update:
+    """Parses and compiles an update query into its algebra, once per version of
+    the file and set of bound namespaces."""
+
+    with open(path, "r", encoding="utf-8") as query_file:
+        return prepareUpdate(query_file.read(), initNs=dict(namespaces))
+
+
+def get_prepared_query(path: Path, graph: Graph) -> Update:
+    """Gets the compiled update query, resolving its prefixes like RDFLib does for
+    query strings, with the namespaces bound in the graph."""
+
+    return prepare_query(
+        path=path,
+        modified=path.stat().st_mtime_ns,
+        namespaces=tuple((p, str(n)) for p, n in graph.namespaces()),
+    )
+
+
+def report_overrun(path: Path, time_budget: float) -> None:
+    """Logs a query still running past its time budget."""
+
+    error(f"Query {path} is still running after its budget of {time_budget}s")
+
+
+def apply_query(
+    graph: Graph,
+    path: Path,
+    time_budget: float = 0,
+    profile: bool = False,
+) -> QueryProfile:
+    """Applies an update query on the graph and measures it, also counting the
+    inserted and deleted triples and tracing the peak memory when profiling,
+    which copies the graph and slows the query down."""
+
+    start = perf_counter()
+    update = get_prepared_query(path=path, graph=graph)
+    prepare_seconds = perf_counter() - start
+    triples_before = len(graph)
+    before: Set[_TripleType] = set(graph) if profile else set()
+
+    # Report queries that are still running, as they cannot be interrupted
+    timer = Timer(time_budget, report_overrun, args=(path, time_budget))
+    timer.daemon = True
+
+    if time_budget > 0:
+        timer.start()
+
+    if profile:
+        start_tracing()
+
+    start = perf_counter()
+
+    try:
+        graph.update(update)
+    finally:
+        update_seconds = perf_counter() - start
+        timer.cancel()
+        peak_memory = get_traced_memory()[1] if profile else None
+        if profile:
+            stop_tracing()
+
+    query_profile = QueryProfile(
+        path=path,
+        prepare_seconds=prepare_seconds,
+        update_seconds=update_seconds,
+        triples_before=triples_before,
+        triples_after=len(graph),
+        peak_memory=peak_memory,
+    )
+
+    if profile:
+        kept = sum(1 for triple in graph if triple in before)
+        query_profile = query_profile._replace(
+            inserted=query_profile.triples_after - kept,
+            deleted=triples_before - kept,
+        )
+
+    return query_profile
+
+
+def format_algebra(value: Any, indent: str = "") -> str:
+    """Formats the compiled algebra of a query as an indented tree."""
+
+    if isinstance(value, CompValue):
+        members = "".join(
+            f"{indent}    {k} = {format_algebra(v, indent + '    ')}\n"
+            for k, v in value.items()
+        )
+        return f"{value.name}(\n{members}{indent})"
+
+    if (
+        isinstance(value, (list, tuple))
+        and value
+        and all(isinstance(v, Node) for v in value)
+    ):
+        return " ".join(v.n3() for v in value)
+
+    if isinstance(value, (list, tuple)):
+        items = "".join(
+            f"{indent}    {format_algebra(v, indent + '    ')}\n" for v in value
+        )
+        return f"[\n{items}{indent}]"
+
+    if isinstance(value, Node):
+        return value.n3()
+
+    return repr(value)
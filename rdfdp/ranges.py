@@ -0,0 +1,265 @@
+"""Byte range and zero-copy responses for on-disk files."""
+
+from os import fstat
+from http import HTTPStatus
+from typing import BinaryIO
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from secrets import token_hex
+from datetime import datetime
+from datetime import timezone
+
+from flask.wrappers import Request
+from flask.wrappers import Response
+
+from werkzeug.datastructures import Range
+from werkzeug.http import is_resource_modified
+
+from utils import CHUNK_SIZE
+
+# The maximum number of ranges served in one response, beyond which the whole
+# file is sent instead, to not allow amplifying requests with many small ranges
+MAX_BYTE_RANGES = 16
+
+# A byte range as its inclusive start and exclusive stop offsets
+ByteRange = Tuple[int, int]
+
+
+def get_byte_ranges(byte_range: Range, length: int) -> List[ByteRange]:
+    """Resolves the requested ranges against the file length, in request order."""
+
+    byte_ranges: List[ByteRange] = []
+
+    for begin, end in byte_range.ranges:
+        if begin < 0:
+            start, stop = max(length + begin, 0), length
+        else:
+            start, stop = begin, length if end is None else min(end, length)
+        if start < stop:
+            byte_ranges.append((start, stop))
+
+    return byte_ranges
+
+
+def iter_file_range(file: BinaryIO, start: int, stop: int) -> Iterator[bytes]:
+    """Reads the bytes of a range from an open file in chunks."""
+
+    file.seek(start)
+    remaining = stop - start
+
+    while remaining > 0:
+        chunk = file.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def iter_file(path: str, start: int, stop: int) -> Iterator[bytes]:
+    """Reads the bytes of a range from a file, opening it only once iterated."""
+
+    with open(path, "rb") as file:
+        yield from iter_file_range(file=file, start=start, stop=stop)
+
+
+def get_multipart_headers(
+    byte_ranges: List[ByteRange],
+    length: int,
+    mimetype: str,
+    boundary: str,
+) -> List[bytes]:
+    """Generates the part headers of a multipart/byteranges body."""
+
+    return [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n"
+        ).encode("ascii")
+        for start, stop in byte_ranges
+    ]
+
+
+def iter_multipart(
+    path: str,
+    byte_ranges: List[ByteRange],
+    part_headers: List[bytes],
+    boundary: str,
+) -> Iterator[bytes]:
+    """Reads the ranges of a file into a multipart/byteranges body."""
+
+    with open(path, "rb") as file:
+        for (start, stop), part_header in zip(byte_ranges, part_headers):
+            yield part_header
+            yield from iter_file_range(file=file, start=start, stop=stop)
+
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+class FileRange:
+    """A reader of an open file that stops at the end of a byte range, as server
+    file wrappers read to the end of the file otherwise, which still exposes the
+    file descriptor for sendfile."""
+
+    def __init__(self, file: BinaryIO, start: int, stop: int) -> None:
+        file.seek(start)
+        self.file = file
+        self.remaining = stop - start
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to size bytes, without going past the end of the range."""
+
+        chunk = self.file.read(
+            self.remaining if size < 0 else min(size, self.remaining)
+        )
+        self.remaining -= len(chunk)
+
+        return chunk
+
+    def fileno(self) -> int:
+        """Returns the file descriptor of the file."""
+        return self.file.fileno()
+
+    def close(self) -> None:
+        """Closes the file."""
+        self.file.close()
+
+
+def wrap_file_range(
+    request: Request,
+    response: Response,
+    path: str,
+    start: int,
+    stop: int,
+) -> Iterable[bytes]:
+    """Returns the server file wrapper for a range when available, which allows
+    servers such as Gunicorn to use sendfile starting from the current offset and
+    limited by Content-Length, and falls back to reading the file in chunks. The
+    file is closed with the response, also when its body is never consumed."""
+
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+
+    if file_wrapper is None:
+        return iter_file(path=path, start=start, stop=stop)
+
+    # pylint: disable-next=consider-using-with
+    file = open(path, "rb")
+    response.call_on_close(file.close)
+
+    return file_wrapper(FileRange(file, start=start, stop=stop), CHUNK_SIZE)
+
+
+def get_requested_ranges(
+    request: Request,
+    length: int,
+    etag: str,
+    last_modified: datetime,
+) -> List[ByteRange] | None:
+    """Resolves the byte ranges of a request, or returns None to send the whole file
+    when no range was requested, or when the If-Range validator no longer matches."""
+
+    byte_range = request.range
+    if_range = request.if_range
+
+    if (
+        byte_range is None
+        or byte_range.units != "bytes"
+        or len(byte_range.ranges) > MAX_BYTE_RANGES
+    ):
+        return None
+
+    if if_range.etag:
+        if if_range.etag != etag:
+            return None
+    elif if_range.date is not None and if_range.date != last_modified:
+        return None
+
+    return get_byte_ranges(byte_range=byte_range, length=length)
+
+
+def set_multipart_response(
+    response: Response,
+    path: str,
+    byte_ranges: List[ByteRange],
+    length: int,
+) -> None:
+    """Sets the multipart/byteranges body of a response for multiple ranges."""
+
+    boundary = token_hex(16)
+    part_headers = get_multipart_headers(
+        byte_ranges=byte_ranges,
+        length=length,
+        mimetype=response.mimetype,
+        boundary=boundary,
+    )
+
+    response.status_code = HTTPStatus.PARTIAL_CONTENT
+    response.content_type = f"multipart/byteranges; boundary={boundary}"
+    response.content_length = (
+        sum(stop - start for start, stop in byte_ranges)
+        + sum(len(h) for h in part_headers)
+        + len(f"\r\n--{boundary}--\r\n")
+    )
+    response.response = iter_multipart(path, byte_ranges, part_headers, boundary)
+
+
+def send_media_file(
+    request: Request,
+    path: str,
+    mimetype: str,
+    etag: str | None = None,
+) -> Response:
+    """Sends a file with support for conditional, single and multiple range
+    requests, using the given strong ETag or one derived from the file status."""
+
+    with open(path, "rb") as file:
+        file_stat = fstat(file.fileno())
+
+    length = file_stat.st_size
+    last_modified = datetime.fromtimestamp(int(file_stat.st_mtime), tz=timezone.utc)
+    etag = etag or f"{file_stat.st_mtime_ns:x}-{length:x}"
+
+    response = Response(mimetype=mimetype, direct_passthrough=True)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.accept_ranges = "bytes"
+
+    if not is_resource_modified(
+        request.environ,
+        etag=etag,
+        last_modified=last_modified,
+    ):
+        response.status_code = HTTPStatus.NOT_MODIFIED
+        return response
+
+    byte_ranges = get_requested_ranges(request, length, etag, last_modified)
+
+    if byte_ranges is not None and not byte_ranges:
+        response.status_code = HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        response.headers.set("Content-Range", f"bytes */{length}")
+        response.content_length = 0
+        return response
+
+    if byte_ranges is not None and len(byte_ranges) > 1:
+        set_multipart_response(response, path, byte_ranges, length)
+        return response
+
+    start, stop = byte_ranges[0] if byte_ranges else (0, length)
+
+    if byte_ranges:
+        response.status_code = HTTPStatus.PARTIAL_CONTENT
+        response.headers.set("Content-Range", f"bytes {start}-{stop - 1}/{length}")
+
+    response.content_length = stop - start
+
+    # Bodies of HEAD responses are never sent, so there is no need to open the file
+    if request.method == "HEAD":
+        response.response = []
+    else:
+        response.response = wrap_file_range(
+            request, response, path=path, start=start, stop=stop
+        )
+
+    return response
@@ -0,0 +1,356 @@
+"""Live reloading of changed data, query and template files."""
+
+from time import sleep
+from time import perf_counter
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Callable
+from typing import Iterable
+from typing import NamedTuple
+from typing import Set
+from pathlib import Path
+from logging import info
+from logging import exception
+from threading import Thread
+
+from rdflib.term import URIRef
+from rdflib.graph import Graph
+from rdflib.graph import _TripleType
+
+from constants import RDF_FILE_EXTENSIONS
+from utils import env_to_path
+from utils import find_files
+from utils import get_document_uri
+from resources import parse_rdf_file_triples
+from resources import add_media_checksums
+from resources import apply_queries
+from resources import group_by_host
+from resources import generate_void_triples
+from resources import add_dump_descriptions
+from resources import bind_namespaces
+from resources import collect_document_datasets
+from resources import index_document_datasets
+from resources import get_document_cache_triples
+from resources import get_files_modified
+from resources import get_subject_digests
+from resources import add_documents_modified
+from resources import add_derived_modified
+from resources import find_subject_documents
+from templates import TEMPLATE_PATH
+from store import DocumentStore
+from store import DocumentDatasets
+from store import get_namespace_manager
+
+# The size and modification time of a file, or None when it does not exist
+FileKey = Tuple[int, int] | None
+
+# Receives the rebuilt dataset, its document datasets and the changed documents
+DatasetsCallback = Callable[[Graph, DocumentDatasets, Set[URIRef]], None]
+
+
+class ParsedFile(NamedTuple):
+    """The triples of an RDF file, with the keys of the files they came from."""
+
+    file_keys: Dict[Path, FileKey]
+    triples: List[_TripleType]
+
+
+def get_file_key(path: Path) -> FileKey:
+    """Identifies the current version of a file by its size and modification time."""
+
+    try:
+        path_stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    return path_stat.st_size, path_stat.st_mtime_ns
+
+
+def scan_files(paths: Iterable[Path]) -> Dict[Path, FileKey]:
+    """Collects the keys of all files within the specified paths."""
+
+    file_keys: Dict[Path, FileKey] = {}
+
+    for path in paths:
+        if path.is_dir():
+            for file_path in path.rglob("*"):
+                if file_path.is_file():
+                    file_keys[file_path] = get_file_key(file_path)
+        else:
+            file_keys[path] = get_file_key(path)
+
+    return file_keys
+
+
+def get_watched_paths() -> Tuple[Path, ...]:
+    """Returns the data, query and template paths."""
+
+    return (
+        env_to_path("DATA_PATH"),
+        env_to_path("QUERIES_PATH"),
+        TEMPLATE_PATH,
+    )
+
+
+def find_changed_documents(old: Graph, new: Graph) -> Set[URIRef]:
+    """Finds the documents whose CBDs differ between two versions of a dataset."""
+
+    return find_subject_documents(
+        graphs=(old, new),
+        subjects=(s for s, _, _ in set(old) ^ set(new)),
+    )
+
+
+class DatasetReloader:
+    """Rebuilds the prepared data from changed files, reusing everything else."""
+
+    def __init__(self) -> None:
+        self.file_keys: Dict[Path, FileKey] = {}
+        self.parsed_files: Dict[Path, ParsedFile] = {}
+        self.void_partitions: Dict[URIRef, Tuple[int, List[_TripleType]]] = {}
+        self.dataset: Graph | None = None
+        self.document_datasets: DocumentDatasets | None = None
+
+    def load_data_files(
+        self,
+        graph: Graph,
+        documents_modified: Dict[URIRef, float] | None = None,
+    ) -> None:
+        """Loads the RDF files into the graph, parsing only the changed ones, and
+        tracks the modification times of the files describing each document."""
+
+        parsed_files: Dict[Path, ParsedFile] = {}
+
+        for path in find_files(
+            path=env_to_path("DATA_PATH"),
+            extensions=RDF_FILE_EXTENSIONS,
+        ):
+            parsed = self.parsed_files.get(path)
+            if parsed is None or any(
+                get_file_key(p) != k for p, k in parsed.file_keys.items()
+            ):
+                info(f"Loading {path}")
+                path_key = get_file_key(path)
+                triples, dependencies, _ = parse_rdf_file_triples(path=path)
+                file_keys = {p: get_file_key(p) for p in dependencies}
+                parsed = ParsedFile(
+                    file_keys={path: path_key, **file_keys}, triples=triples
+                )
+            parsed_files[path] = parsed
+            graph.addN((s, p, o, graph) for s, p, o in parsed.triples)
+            if documents_modified is not None:
+                add_documents_modified(
+                    documents_modified,
+                    triples=parsed.triples,
+                    modified=max(k[1] for k in parsed.file_keys.values() if k) / 1e9,
+                )
+
+        self.parsed_files = parsed_files
+
+    def add_void_descriptions(self, graph: Graph) -> None:
+        """Adds VoID descriptions, generating them only for the changed hostnames."""
+
+        void_partitions: Dict[URIRef, Tuple[int, List[_TripleType]]] = {}
+        datasets_for_void = group_by_host(graph=graph)
+
+        add_dump_descriptions(graph=graph, dataset_uris=datasets_for_void.keys())
+
+        for dataset_uri, dataset_graph in datasets_for_void.items():
+            partition_hash = hash(frozenset(dataset_graph))
+            previous = self.void_partitions.get(dataset_uri)
+            if previous and previous[0] == partition_hash:
+                triples = previous[1]
+            else:
+                info(f"Generating VoID description for {dataset_uri.n3()}")
+                triples = generate_void_triples(dataset_uri, dataset_graph)
+            void_partitions[dataset_uri] = (partition_hash, triples)
+            graph.addN((s, p, o, graph) for s, p, o in triples)
+
+        self.void_partitions = void_partitions
+
+    def collect_documents(
+        self,
+        graph: Graph,
+        changed_documents: Set[URIRef],
+        documents_modified: Dict[URIRef, float],
+    ) -> DocumentDatasets:
+        """Collects the changed documents, sharing the unchanged ones with the store
+        still being served, or indexes all documents when collected lazily."""
+
+        if get_document_cache_triples() > 0:
+            return index_document_datasets(
+                dataset=graph,
+                max_triples=get_document_cache_triples(),
+                documents_modified=documents_modified,
+            )
+
+        document_datasets = None
+
+        if isinstance(self.document_datasets, DocumentStore):
+            document_datasets = self.document_datasets.copy(
+                namespace_manager=get_namespace_manager(graph.namespaces()),
+                exclude=changed_documents,
+            )
+
+        document_datasets = collect_document_datasets(
+            dataset=graph,
+            subjects=(
+                s
+                for s in graph.subjects(unique=True)
+                if isinstance(s, URIRef) and get_document_uri(s) in changed_documents
+            ),
+            document_datasets=document_datasets,
+        )
+        document_datasets.modified = {
+            u: m for u, m in documents_modified.items() if u in document_datasets
+        }
+
+        return document_datasets
+
+    def rebuild(self) -> Tuple[Graph, DocumentDatasets, Set[URIRef]]:
+        """Rebuilds the dataset and the changed document datasets, returning them
+        together with the changed documents."""
+
+        graph = Graph()
+
+        # Track the sources of the documents in the first build, after which only
+        # the changed documents get the latest modification time of the files
+        documents_modified: Dict[URIRef, float] | None = (
+            {} if self.document_datasets is None else None
+        )
+
+        self.load_data_files(graph=graph, documents_modified=documents_modified)
+        loaded_digests = (
+            get_subject_digests(graph) if documents_modified is not None else {}
+        )
+        add_media_checksums(graph=graph)
+        apply_queries(graph=graph)
+        self.add_void_descriptions(graph=graph)
+        bind_namespaces(graph=graph)
+
+        # A change of prefixes changes the serializations of all documents
+        if self.dataset is None or set(graph.namespaces()) != set(
+            self.dataset.namespaces()
+        ):
+            changed_documents = {
+                get_document_uri(s)
+                for s in graph.subjects(unique=True)
+                if isinstance(s, URIRef)
+            }
+        else:
+            changed_documents = find_changed_documents(old=self.dataset, new=graph)
+
+        if documents_modified is None:
+            assert self.document_datasets is not None, "The data was not loaded"
+            documents_modified = {
+                **self.document_datasets.modified,
+                **dict.fromkeys(changed_documents, get_files_modified().timestamp()),
+            }
+        else:
+            add_derived_modified(documents_modified, loaded_digests, graph)
+
+        document_datasets = self.collect_documents(
+            graph, changed_documents, documents_modified
+        )
+
+        self.dataset = graph
+        self.document_datasets = document_datasets
+
+        return graph, document_datasets, changed_documents
+
+    def load(self) -> DocumentDatasets:
+        """Builds the data to serve at startup, keeping the parsed files for later
+        incremental rebuilds."""
+
+        # Scan before parsing, so that changes made while loading are reloaded
+        self.file_keys = scan_files(paths=get_watched_paths())
+
+        _, document_datasets, _ = self.rebuild()
+
+        # Also watch the referenced files, such as those outside the data path
+        for parsed in self.parsed_files.values():
+            for path, path_key in parsed.file_keys.items():
+                self.file_keys.setdefault(path, path_key)
+
+        return document_datasets
+
+    def try_rebuild(self, on_datasets: DatasetsCallback) -> None:
+        """Rebuilds the data and passes it on, keeping the previous data in use on
+        failure."""
+
+        start = perf_counter()
+
+        try:
+            dataset, document_datasets, changed_documents = self.rebuild()
+            on_datasets(dataset, document_datasets, changed_documents)
+        except Exception:  # pylint: disable=broad-exception-caught
+            exception("Failed to reload the data, serving the previous data")
+            return
+
+        info(
+            f"Reloaded {len(changed_documents)} documents"
+            f" in {perf_counter() - start:.3f} seconds"
+        )
+
+    def watch(
+        self,
+        interval: float,
+        on_datasets: DatasetsCallback,
+        on_templates: Callable[[], None],
+    ) -> None:
+        """Polls the files for changes after the data was loaded, and reloads
+        whatever they affect."""
+
+        assert self.dataset is not None, "The data was not loaded"
+
+        watched_paths = get_watched_paths()
+
+        while True:
+            sleep(interval)
+
+            file_keys = scan_files(
+                paths=(
+                    *watched_paths,
+                    *(p for f in self.parsed_files.values() for p in f.file_keys),
+                )
+            )
+            changed_paths = set(
+                p
+                for p in self.file_keys.keys() | file_keys.keys()
+                if self.file_keys.get(p) != file_keys.get(p)
+            )
+            self.file_keys = file_keys
+
+            if not changed_paths:
+                continue
+
+            info(f"Detected changes in {len(changed_paths)} files")
+
+            if any(p.is_relative_to(TEMPLATE_PATH) for p in changed_paths):
+                on_templates()
+
+            if any(not p.is_relative_to(TEMPLATE_PATH) for p in changed_paths):
+                self.try_rebuild(on_datasets=on_datasets)
+
+    def start(
+        self,
+        interval: float,
+        on_datasets: DatasetsCallback,
+        on_templates: Callable[[], None],
+    ) -> Thread:
+        """Starts watching the files for changes in a background thread."""
+
+        thread = Thread(
+            target=self.watch,
+            kwargs={
+                "interval": interval,
+                "on_datasets": on_datasets,
+                "on_templates": on_templates,
+            },
+            name="reloader",
+            daemon=True,
+        )
+        thread.start()
+
+        return thread
@@ -1,22 +1,33 @@
 """Utility functions for accessing the application data."""
 
 from os import stat
+from os import getenv
+from time import perf_counter
 from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Set
+from typing import Iterable
 from pathlib import Path
 from logging import debug
 from logging import info
 from logging import warning
+from datetime import date
+from datetime import time
 from datetime import datetime
 from datetime import timezone
 from mimetypes import guess_type
 from mimetypes import add_type
 from functools import cache
-from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor
 
 from rdflib.void import generateVoID
 from rdflib.term import URIRef
+from rdflib.term import BNode
 from rdflib.term import Literal
 from rdflib.graph import Graph
+from rdflib.graph import _TripleType
+from rdflib.graph import _SubjectType
 from rdflib.namespace import RDF
 from rdflib.namespace import SDO
 from rdflib.namespace import XSD
@@ -30,18 +41,33 @@ from constants import XSD_DATETIME_FORMAT
 from constants import SPARQL_FILE_EXTENSIONS
 from constants import CONTENT_EMBED_PREDICATES
 from utils import partition_to_fragment
-from utils import get_file_sha256sum
 from utils import uri_to_path
 from utils import env_to_path
 from utils import find_files
-
+from utils import get_document_uri
+from snapshot import get_manifest
+from snapshot import get_manifest_digest
+from snapshot import read_snapshot
+from snapshot import write_snapshot
+from checksums import get_file_sha256sums
+from dumps import get_dataset_uri
+from dumps import generate_dump_triples
+from queries import QueryProfile
+from queries import QueryBudgetError
+from queries import apply_query
+from metrics import startup_phase
+from store import DocumentGraph
+from store import DocumentStore
+from store import DocumentDatasets
+from store import LazyDocumentStore
+from store import get_namespace_manager
 
 # Add custom mimetypes, or missing ones
 for mimetype, extension in CUSTOM_MIMETYPES.items():
     add_type(mimetype, extension, strict=False)
 
 
-def parse_rdf_file(path: Path) -> Graph:
+def parse_rdf_file(path: Path, dependencies: Set[Path] | None = None) -> Graph:
     """Loads the specified file as RDF into the graph."""
 
     graph = Graph(identifier=path.as_posix())
@@ -49,8 +75,10 @@ def parse_rdf_file(path: Path) -> Graph:
 
     for s, p, o in graph:
         if isinstance(o, URIRef) and o.startswith(FILE_URI_PREFIX):
-            o_tail = o.removeprefix(FILE_URI_PREFIX)
-            o_path = path.parent.joinpath(o_tail).resolve(strict=True)
+            o_path = path.parent.joinpath(o.removeprefix(FILE_URI_PREFIX))
+            o_path = o_path.resolve(strict=True)
+            if dependencies is not None:
+                dependencies.add(o_path)
             if p in CONTENT_EMBED_PREDICATES:
                 warning(f"Loading content from {o_path}")
                 with open(o_path, "r", encoding="utf-8") as o_file:
@@ -82,9 +110,6 @@ def parse_rdf_file(path: Path) -> Graph:
         s_type = guess_type(url=s_path, strict=False)[0]
         graph.set((s, SDO.encodingFormat, Literal(s_type)))
 
-        # Add SHA256 checksum
-        graph.set((s, SDO.sha256, Literal(get_file_sha256sum(path=s_path))))
-
         # Add file size in bytes
         s_stat = stat(path=s_path)
         graph.set((s, SDO.size, Literal(str(s_stat.st_size), datatype=XSD.integer)))
@@ -111,93 +136,554 @@ def parse_rdf_file(path: Path) -> Graph:
     return graph
 
 
-@cache
-def get_dataset() -> Graph:
-    """Loads all data from the specified path as an RDF graph."""
+def parse_rdf_file_triples(
+    path: Path,
+) -> Tuple[List[_TripleType], Set[Path], float]:
+    """Loads the specified file as RDF, returning the triples, the other files
+    referenced from it, and the time taken."""
 
-    graph = Graph()
+    start = perf_counter()
+    dependencies: Set[Path] = set()
+    triples = list(parse_rdf_file(path=path, dependencies=dependencies))
 
-    for path in find_files(
-        path=env_to_path("DATA_PATH"),
-        extensions=RDF_FILE_EXTENSIONS,
-    ):
-        info(f"Loading {path}")
-        graph += parse_rdf_file(path=path)
+    return triples, dependencies, perf_counter() - start
 
-    for path in find_files(
-        path=env_to_path("QUERIES_PATH"),
-        extensions=SPARQL_FILE_EXTENSIONS,
-    ):
-        info(f"Applying {path}")
-        with open(path, "r", encoding="utf-8") as query_file:
-            graph.update(query_file.read())
 
-    info("Grouping into datasets for VoID generation")
+def get_source_modified(paths: Iterable[Path]) -> float:
+    """Finds the latest modification time of a file and the files it references."""
+
+    return max((p.stat().st_mtime for p in paths), default=0)
+
+
+def add_documents_modified(
+    documents_modified: Dict[URIRef, float],
+    triples: Iterable[_TripleType],
+    modified: float,
+) -> None:
+    """Raises the modification times of the documents that the triples of a file
+    describe to the modification time of the file."""
+
+    for s, _, _ in triples:
+        if isinstance(s, URIRef):
+            document_uri = get_document_uri(s)
+            if documents_modified.get(document_uri, 0) < modified:
+                documents_modified[document_uri] = modified
+
+
+def load_data_files(
+    graph: Graph,
+    documents_modified: Dict[URIRef, float] | None = None,
+) -> Dict[Path, float]:
+    """Loads all the RDF files into the graph, optionally using multiple processes,
+    and tracks the modification times of the files describing each document."""
+
+    paths = list(
+        find_files(path=env_to_path("DATA_PATH"), extensions=RDF_FILE_EXTENSIONS)
+    )
+    processes = int(getenv("LOAD_PROCESSES") or 1)
+    timings: Dict[Path, float] = {}
+
+    if processes > 1 and len(paths) > 1:
+        info(f"Loading {len(paths)} files using {processes} processes")
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for path, (triples, dependencies, duration) in zip(
+                paths, executor.map(parse_rdf_file_triples, paths)
+            ):
+                info(f"Loaded {path} in {duration:.3f} seconds")
+                graph.addN((s, p, o, graph) for s, p, o in triples)
+                timings[path] = duration
+                if documents_modified is not None:
+                    add_documents_modified(
+                        documents_modified,
+                        triples=triples,
+                        modified=get_source_modified((path, *dependencies)),
+                    )
+    else:
+        for path in paths:
+            info(f"Loading {path}")
+            triples, dependencies, duration = parse_rdf_file_triples(path=path)
+            debug(f"Loaded {path} in {duration:.3f} seconds")
+            graph.addN((s, p, o, graph) for s, p, o in triples)
+            timings[path] = duration
+            if documents_modified is not None:
+                add_documents_modified(
+                    documents_modified,
+                    triples=triples,
+                    modified=get_source_modified((path, *dependencies)),
+                )
 
-    datasets_for_void: Dict[URIRef, Graph] = {}
+    return timings
+
+
+def group_by_host(graph: Graph) -> Dict[URIRef, Graph]:
+    """Partitions the graph into per-hostname datasets of subject CBDs."""
+
+    datasets: Dict[URIRef, Graph] = {}
     non_uri_subjects = 0
 
-    for s, p, o in graph:
+    for s in graph.subjects(unique=True):
         if isinstance(s, URIRef):
-            dataset_uri = URIRef(urljoin(base=s, url="/", allow_fragments=False))
-            if dataset_uri not in datasets_for_void:
-                datasets_for_void[dataset_uri] = Graph(identifier=dataset_uri)
-            graph.cbd(resource=s, target_graph=datasets_for_void[dataset_uri])
+            dataset_uri = get_dataset_uri(s)
+            if dataset_uri not in datasets:
+                datasets[dataset_uri] = Graph(identifier=dataset_uri)
+            graph.cbd(resource=s, target_graph=datasets[dataset_uri])
         else:
             non_uri_subjects += 1
 
     if non_uri_subjects:
         warning(f"Detected {non_uri_subjects} non-URI resources")
 
-    for dataset_uri, dataset_graph in datasets_for_void.items():
-        info(f"Generating VoID description for {dataset_uri.n3()}")
-        dataset_void = generateVoID(
-            g=dataset_graph,
-            dataset=dataset_uri,
-            distinctForPartitions=True,
-        )[0]
-
-        # Convert underscore identifiers to fragments on the dataset URI
-        partition_prefix = f"{dataset_uri}_"
-        for s, p, o in dataset_void:
-            if isinstance(s, URIRef) and s.startswith(partition_prefix):
-                s = partition_to_fragment(dataset_uri=dataset_uri, partition_uri=s)
-            if isinstance(o, URIRef) and o.startswith(partition_prefix):
-                o = partition_to_fragment(dataset_uri=dataset_uri, partition_uri=o)
-            graph.add((s, p, o))
-
-        # Add void:uriSpace
-        graph.add((dataset_uri, VOID.uriSpace, Literal(dataset_uri)))
+    return datasets
+
+
+def generate_void_triples(
+    dataset_uri: URIRef,
+    dataset_graph: Graph,
+) -> List[_TripleType]:
+    """Generates the VoID description of a dataset, with partitions as fragments."""
+
+    dataset_void = generateVoID(
+        g=dataset_graph,
+        dataset=dataset_uri,
+        distinctForPartitions=True,
+    )[0]
+
+    triples: List[_TripleType] = []
+
+    # Convert underscore identifiers to fragments on the dataset URI, named after
+    # the class or property of the partition, as RDFLib numbers them in the
+    # arbitrary order of a set
+    partition_prefix = f"{dataset_uri}_"
+    fragments = {
+        s: partition_to_fragment(dataset_uri=dataset_uri, partition_name=f"{p} {o}")
+        for s, p, o in dataset_void
+        if p in (VOID["class"], VOID.property)
+        and isinstance(s, URIRef)
+        and s.startswith(partition_prefix)
+    }
+    # Count the typed subjects of the property partitions again, as RDFLib also
+    # counts the subjects whose types it looked up before, in arbitrary order
+    typed_subjects = set(dataset_graph.subjects(predicate=RDF.type))
+    property_entities = {
+        s: sum(
+            1
+            for subject in set(dataset_graph.subjects(predicate=o))
+            if subject in typed_subjects
+        )
+        for s, p, o in dataset_void
+        if p == VOID.property
+    }
+    for s, p, o in dataset_void:
+        if p == VOID.entities and s in property_entities:
+            o = Literal(property_entities[s])
+        triples.append((fragments.get(s, s), p, fragments.get(o, o)))
 
-    info(f"Loaded {len(graph)} triples")
+    # Add void:uriSpace
+    triples.append((dataset_uri, VOID.uriSpace, Literal(dataset_uri)))
+
+    return triples
+
+
+def get_dump_path() -> Path | None:
+    """Gets the directory to write the dataset dumps into, or None when disabled."""
+
+    dump_path = getenv("DUMP_PATH")
+
+    return Path(dump_path) if dump_path else None
+
+
+def add_dump_descriptions(graph: Graph, dataset_uris: Iterable[URIRef]) -> None:
+    """Advertises the dumps of the hostname datasets, when enabled."""
+
+    dump_path = get_dump_path()
+
+    if dump_path:
+        for dataset_uri in dataset_uris:
+            triples = generate_dump_triples(dataset_uri, dump_path=dump_path)
+            graph.addN((s, p, o, graph) for s, p, o in triples)
+
+
+def add_void_descriptions(graph: Graph) -> None:
+    """Adds VoID descriptions for every hostname dataset, in parallel if enabled."""
+
+    info("Grouping into datasets for VoID generation")
+
+    datasets_for_void = group_by_host(graph=graph)
+    add_dump_descriptions(graph=graph, dataset_uris=datasets_for_void.keys())
+    processes = int(getenv("LOAD_PROCESSES") or 1)
+
+    if processes > 1 and len(datasets_for_void) > 1:
+        info(f"Generating {len(datasets_for_void)} VoID descriptions in parallel")
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for triples in executor.map(
+                generate_void_triples,
+                datasets_for_void.keys(),
+                datasets_for_void.values(),
+            ):
+                graph.addN((s, p, o, graph) for s, p, o in triples)
+    else:
+        for dataset_uri, dataset_graph in datasets_for_void.items():
+            info(f"Generating VoID description for {dataset_uri.n3()}")
+            triples = generate_void_triples(dataset_uri, dataset_graph)
+            graph.addN((s, p, o, graph) for s, p, o in triples)
+
+
+def add_media_checksums(graph: Graph) -> None:
+    """Adds the SHA256 checksums of all schema:MediaObject files in the graph."""
+
+    media_paths: Dict[_SubjectType, Path] = {}
+
+    for s in graph.subjects(predicate=RDF.type, object=SDO.MediaObject, unique=True):
+        s_uri = next(
+            (
+                u
+                for u in graph.objects(subject=s, predicate=SDO.contentUrl)
+                if isinstance(u, URIRef) and u.startswith(FILE_URI_PREFIX)
+            ),
+            None,
+        )
+        if s_uri:
+            media_paths[s] = uri_to_path(s_uri)
+
+    cache_path = getenv("CHECKSUM_CACHE_PATH")
+    checksums = get_file_sha256sums(
+        paths=media_paths.values(),
+        cache_path=Path(cache_path) if cache_path else None,
+        max_workers=int(getenv("CHECKSUM_THREADS") or 0) or None,
+    )
+
+    for s, s_path in media_paths.items():
+        graph.set((s, SDO.sha256, Literal(checksums[s_path])))
+
+
+def get_query_time_budget() -> float:
+    """Gets the time in seconds any single query may take, or zero when unlimited."""
+
+    return float(getenv("QUERY_TIME_BUDGET") or 0)
+
+
+def apply_queries(graph: Graph, profile: bool = False) -> List[QueryProfile]:
+    """Applies all the update queries on the graph, in order, failing after the
+    first one that completed over the time budget."""
+
+    time_budget = get_query_time_budget()
+    query_profiles: List[QueryProfile] = []
+
+    for path in find_files(
+        path=env_to_path("QUERIES_PATH"),
+        extensions=SPARQL_FILE_EXTENSIONS,
+    ):
+        debug(f"Applying {path}")
+        query_profile = apply_query(
+            graph=graph,
+            path=path,
+            time_budget=time_budget,
+            profile=profile,
+        )
+        query_profiles.append(query_profile)
+        query_seconds = query_profile.prepare_seconds + query_profile.update_seconds
+        info(
+            f"Applied {path} in {query_seconds:.3f}s, changing"
+            f" {query_profile.triples_after - query_profile.triples_before:+}"
+            f" triples"
+        )
+        if 0 < time_budget < query_seconds:
+            raise QueryBudgetError(
+                f"Query {path} took {query_seconds:.3f}s,"
+                f" exceeding QUERY_TIME_BUDGET of {time_budget}s",
+                query_profiles=query_profiles,
+            )
+
+    return query_profiles
+
+
+def bind_namespaces(graph: Graph) -> None:
+    """Binds the additional namespaces that are not included in RDFLib."""
 
-    # Bind additional namespaces
     for prefix, namespace_uri in CUSTOM_PREFIXES.items():
         graph.namespace_manager.bind(prefix=prefix, namespace=namespace_uri)
 
+
+def index_document_subjects(
+    subjects: Iterable[_SubjectType],
+) -> Dict[URIRef, List[URIRef]]:
+    """Groups the URI subjects by the documents they are described in."""
+
+    document_subjects: Dict[URIRef, List[URIRef]] = {}
+
+    for s in subjects:
+        if isinstance(s, URIRef):
+            document_subjects.setdefault(get_document_uri(s), []).append(s)
+
+    return document_subjects
+
+
+def collect_document_datasets(
+    dataset: Graph,
+    subjects: Iterable[_SubjectType],
+    document_datasets: DocumentStore | None = None,
+) -> DocumentStore:
+    """Collects the CBDs of the subjects into the documents of a store."""
+
+    if document_datasets is None:
+        document_datasets = DocumentStore(
+            namespace_manager=get_namespace_manager(dataset.namespaces()),
+        )
+
+    # Build one document graph at a time, and only keep its compact triples
+    for document_uri, s_list in index_document_subjects(subjects=subjects).items():
+        debug(f"Registered {document_uri.n3()} as document")
+        document_graph = Graph()
+        for s in s_list:
+            dataset.cbd(resource=s, target_graph=document_graph)
+        document_datasets.add(document_uri=document_uri, triples=document_graph)
+
+    return document_datasets
+
+
+def find_subject_documents(
+    graphs: Iterable[Graph],
+    subjects: Iterable[_SubjectType],
+) -> Set[URIRef]:
+    """Finds the documents describing the subjects, following blank nodes to the
+    resources referring to them in any of the graphs."""
+
+    graphs = tuple(graphs)
+    pending: List[_SubjectType] = list(subjects)
+    visited: Set[_SubjectType] = set()
+    documents: Set[URIRef] = set()
+
+    while pending:
+        s = pending.pop()
+        if s not in visited:
+            visited.add(s)
+            if isinstance(s, URIRef):
+                documents.add(get_document_uri(s))
+            elif isinstance(s, BNode):
+                # Blank nodes belong to the CBDs of the resources referring to them
+                for graph in graphs:
+                    pending.extend(graph.subjects(object=s, unique=True))
+
+    return documents
+
+
+def get_subject_digests(graph: Graph) -> Dict[_SubjectType, int]:
+    """Fingerprints the triples about every document and blank node, independently
+    of their order."""
+
+    digests: Dict[_SubjectType, int] = {}
+
+    for triple in graph:
+        s = triple[0]
+        key = get_document_uri(s) if isinstance(s, URIRef) else s
+        digests[key] = digests.get(key, 0) ^ hash(triple)
+
+    return digests
+
+
+def add_derived_modified(
+    documents_modified: Dict[URIRef, float],
+    loaded_digests: Dict[_SubjectType, int],
+    graph: Graph,
+) -> None:
+    """Gives the documents that changed after loading the files, through the
+    queries or the generated descriptions, the latest modification time of all
+    the input files, as they may be derived from any of them."""
+
+    digests = get_subject_digests(graph)
+    files_modified = get_files_modified().timestamp()
+
+    for document_uri in find_subject_documents(
+        graphs=(graph,),
+        subjects=(
+            k
+            for k in digests.keys() | loaded_digests.keys()
+            if digests.get(k) != loaded_digests.get(k)
+        ),
+    ):
+        documents_modified[document_uri] = files_modified
+
+
+def get_files_modified() -> datetime:
+    """Finds the latest modification time of the data and query files."""
+
+    timestamps = (
+        p.stat().st_mtime
+        for root in (env_to_path("DATA_PATH"), env_to_path("QUERIES_PATH"))
+        for p in root.rglob("*")
+        if p.is_file()
+    )
+
+    return datetime.fromtimestamp(max(timestamps, default=0), tz=timezone.utc)
+
+
+def get_document_modified(
+    document_uri: URIRef,
+    document_graph: DocumentGraph | Graph,
+    source_modified: datetime,
+) -> datetime:
+    """Determines the modification time of a document, from schema:dateModified
+    when available, or from its source files otherwise."""
+
+    date_modified = document_graph.value(
+        subject=document_uri,
+        predicate=SDO.dateModified,
+    )
+    date_modified = (
+        date_modified.toPython() if isinstance(date_modified, Literal) else None
+    )
+
+    if isinstance(date_modified, datetime):
+        return (
+            date_modified
+            if date_modified.tzinfo
+            else date_modified.replace(tzinfo=timezone.utc)
+        )
+
+    if isinstance(date_modified, date):
+        return datetime.combine(date_modified, time(), tzinfo=timezone.utc)
+
+    return source_modified
+
+
+@cache
+def get_snapshot_digest() -> str:
+    """Generates the digest of the current input files for snapshot validation."""
+
+    manifest = get_manifest(
+        data_path=env_to_path("DATA_PATH"),
+        queries_path=env_to_path("QUERIES_PATH"),
+    )
+    dump_path = get_dump_path()
+
+    # The dump location is part of the prepared data, in the VoID descriptions
+    if dump_path:
+        manifest["dump_path"] = dump_path.absolute().as_posix()
+
+    return get_manifest_digest(manifest=manifest)
+
+
+@cache
+def get_snapshot() -> DocumentStore | None:
+    """Loads the prepared data from the snapshot, when configured and up to date."""
+
+    snapshot_path = getenv("SNAPSHOT_PATH")
+
+    if not snapshot_path:
+        return None
+
+    return read_snapshot(path=Path(snapshot_path), digest=get_snapshot_digest())
+
+
+def get_dataset(documents_modified: Dict[URIRef, float] | None = None) -> Graph:
+    """Loads all data from the specified path as an RDF graph, and tracks the
+    modification times of the sources of each document when requested."""
+
+    graph = Graph()
+
+    with startup_phase("load_data_files"):
+        load_data_files(graph=graph, documents_modified=documents_modified)
+
+    loaded_digests = (
+        get_subject_digests(graph) if documents_modified is not None else {}
+    )
+
+    with startup_phase("add_media_checksums"):
+        add_media_checksums(graph=graph)
+    with startup_phase("apply_queries"):
+        apply_queries(graph=graph)
+    with startup_phase("add_void_descriptions"):
+        add_void_descriptions(graph=graph)
+
+    if documents_modified is not None:
+        add_derived_modified(documents_modified, loaded_digests, graph)
+
+    info(f"Loaded {len(graph)} triples")
+
+    bind_namespaces(graph=graph)
+
     return graph
 
 
+def get_document_cache_triples() -> int:
+    """Gets the triple bound of lazily collected documents, or zero when disabled."""
+
+    return int(getenv("DOCUMENT_CACHE_TRIPLES", "0"))
+
+
+def index_document_datasets(
+    dataset: Graph,
+    max_triples: int,
+    documents_modified: Dict[URIRef, float],
+) -> LazyDocumentStore:
+    """Indexes the documents of the dataset, and keeps the dataset for collecting
+    their datasets on demand instead of at startup."""
+
+    info("Indexing document datasets")
+
+    with startup_phase("index_document_datasets"):
+        document_datasets = LazyDocumentStore(
+            dataset=dataset,
+            document_subjects=index_document_subjects(dataset.subjects(unique=True)),
+            max_triples=max_triples,
+            modified=documents_modified,
+        )
+
+    info(
+        f"Indexed {len(document_datasets)} document datasets,"
+        f" caching up to {max_triples} triples"
+    )
+
+    return document_datasets
+
+
 @cache
-def get_document_datasets() -> Dict[URIRef, Graph]:
-    """Collect the document datasets into their own ready-to-serialize graphs."""
+def get_document_datasets() -> DocumentDatasets:
+    """Collect the document datasets into a compact store, and let the merged
+    dataset be released once they have been collected, or index them for lazy
+    collection when DOCUMENT_CACHE_TRIPLES is set."""
+
+    documents_modified: Dict[URIRef, float] = {}
+
+    if get_document_cache_triples() > 0:
+        return index_document_datasets(
+            dataset=get_dataset(documents_modified=documents_modified),
+            max_triples=get_document_cache_triples(),
+            documents_modified=documents_modified,
+        )
+
+    with startup_phase("read_snapshot"):
+        snapshot = get_snapshot()
 
-    dataset = get_dataset()
-    document_datasets: Dict[URIRef, Graph] = {}
+    if snapshot:
+        return snapshot
+
+    dataset = get_dataset(documents_modified=documents_modified)
 
     info("Preparing document datasets")
 
-    for s in dataset.subjects(unique=True):
-        if isinstance(s, URIRef):
-            s_document = URIRef(s.split("#")[0])
-            if s_document not in document_datasets:
-                debug(f"Registered {s_document.n3()} as document")
-                document_datasets[s_document] = Graph(
-                    identifier=s_document,
-                    namespace_manager=dataset.namespace_manager,
-                )
-            dataset.cbd(resource=s, target_graph=document_datasets[s_document])
+    with startup_phase("collect_document_datasets"):
+        document_datasets = collect_document_datasets(
+            dataset=dataset,
+            subjects=dataset.subjects(unique=True),
+        )
 
-    info(f"Prepared {len(document_datasets)} document datasets")
+    document_datasets.modified = documents_modified
+
+    info(
+        f"Prepared {len(document_datasets)} document datasets"
+        f" with {document_datasets.triple_count} triples"
+        f" and {len(document_datasets.term_table)} distinct terms"
+    )
+
+    snapshot_path = getenv("SNAPSHOT_PATH")
+
+    if snapshot_path:
+        with startup_phase("write_snapshot"):
+            write_snapshot(
+                path=Path(snapshot_path),
+                digest=get_snapshot_digest(),
+                document_datasets=document_datasets,
+            )
 
     return document_datasets
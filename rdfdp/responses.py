@@ -0,0 +1,179 @@
+"""Caching of serialized document responses."""
+
+from typing import Any
+from typing import Dict
+from typing import Callable
+from typing import Hashable
+from typing import Iterable
+from typing import NamedTuple
+from hashlib import sha256
+from logging import debug
+from threading import Lock
+from datetime import datetime
+from http import HTTPStatus
+from collections import OrderedDict
+
+from flask.wrappers import Response
+from flask import request
+
+from compressors import compress_variants
+
+
+class CachedResponse(NamedTuple):
+    """A serialized document representation that is ready to be sent."""
+
+    body: bytes
+    content_length: int
+    sha256: str
+    encoded: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        """The memory used by the body and all of its encoded variants."""
+        return self.content_length + sum(len(v) for v in self.encoded.values())
+
+
+def create_cached_response(
+    body: bytes,
+    compressors: Dict[str, Callable[[bytes], bytes]] | None = None,
+) -> CachedResponse:
+    """Wraps serialized bytes into a cache entry with length and content hash."""
+
+    return CachedResponse(
+        body=body,
+        content_length=len(body),
+        sha256=sha256(body, usedforsecurity=False).hexdigest(),
+        encoded=compress_variants(body=body, compressors=compressors or {}),
+    )
+
+
+# pylint: disable-next=too-many-instance-attributes
+class ResponseCache:
+    """Least-recently-used response cache, bounded by the total size of bodies."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        """Returns the cached response for the key, marking it as recently used."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+
+        return entry
+
+    def put(
+        self,
+        key: Hashable,
+        entry: CachedResponse,
+        generation: int = 0,
+    ) -> CachedResponse:
+        """Stores the response, evicting the least recently used ones when full,
+        unless it was built from data older than the latest eviction."""
+
+        if entry.size > self.max_size:
+            debug(f"Response for {key} exceeds the cache size, not caching")
+            return entry
+
+        with self._lock:
+            if generation < self.generation:
+                debug(f"Response for {key} is from outdated data, not caching")
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+
+        return entry
+
+    def evict(
+        self,
+        predicate: Callable[[Hashable], bool],
+        generation: int | None = None,
+    ) -> int:
+        """Drops the cached responses with matching keys, returning their count,
+        and refuses responses from before the given generation of the data from
+        then on, so that requests still in flight cannot cache outdated ones."""
+
+        with self._lock:
+            if generation is not None:
+                self.generation = max(self.generation, generation)
+            keys = [k for k in self._entries if predicate(k)]
+            for key in keys:
+                self.size -= self._entries.pop(key).size
+
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drops all the cached responses."""
+
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def get_not_modified_response(
+    etag: str | None,
+    last_modified: datetime,
+    mimetype: str,
+    encodings: Iterable[str],
+) -> Response | None:
+    """Answers conditional requests from the validators of the route alone, before
+    the document is looked up, serialized or rendered, or returns None when the
+    full response is needed. The ETags of
+    every content encoding in encodings match as well."""
+
+    if request.method not in ("GET", "HEAD"):
+        return None
+
+    if request.if_none_match:
+        if etag is None:
+            return None
+        # Match the ETags of all encodings, as every one of them is unchanged
+        matched_etag = next(
+            (
+                e
+                for e in (etag, *(f"{etag}-{c}" for c in encodings))
+                if request.if_none_match.contains_weak(e)
+            ),
+            etag if request.if_none_match.star_tag else None,
+        )
+        if matched_etag is None:
+            return None
+    elif (
+        request.if_modified_since is None
+        or last_modified.replace(microsecond=0) > request.if_modified_since
+    ):
+        return None
+    else:
+        matched_etag = etag
+
+    response = Response(status=HTTPStatus.NOT_MODIFIED, mimetype=mimetype)
+
+    if matched_etag:
+        response.set_etag(matched_etag)
+
+    return response
@@ -0,0 +1,249 @@
+"""Routing table resolving request URIs to everything needed to answer them."""
+
+from typing import Dict
+from typing import Tuple
+from typing import Iterable
+from typing import Set
+from typing import NamedTuple
+from hashlib import sha256
+from logging import error
+from datetime import datetime
+from datetime import timezone
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from werkzeug.http import parse_accept_header
+from werkzeug.datastructures import MIMEAccept
+
+from rdflib.term import URIRef
+from rdflib.term import Literal
+from rdflib.graph import Graph
+from rdflib.namespace import RDF
+from rdflib.namespace import OWL
+from rdflib.namespace import SDO
+
+from constants import ACCEPT_MIMETYPES
+from resources import get_document_modified
+from templates import find_template
+from store import DocumentGraph
+from store import DocumentStore
+from store import DocumentDatasets
+from serializers import iter_chunks
+from serializers import iter_ntriples
+from serializers import get_prefix_map
+from serializers import STREAM_CHUNK_SIZE
+from utils import uri_to_path
+
+# The scheme, host with port, and path identifying a document in requests
+RouteKey = Tuple[str, str, str]
+
+# The number of distinct Accept headers to remember the negotiation results for
+NEGOTIATION_CACHE_SIZE = 1024
+
+
+class DocumentRoute(NamedTuple):
+    """The response plan of a document, resolved once from its description."""
+
+    document_uri: URIRef
+    mimetypes: Tuple[str, ...]
+    last_modified: datetime
+    redirect: URIRef | None = None
+    media_mimetype: str | None = None
+    media_path: str | None = None
+    media_etag: str | None = None
+    template_name: str | None = None
+    template_type: str | None = None
+    content_hash: str | None = None
+
+
+def get_route_key(uri: str) -> RouteKey:
+    """Splits a document URI into the parts matched against requests."""
+
+    parsed_uri = urlparse(uri)
+
+    return parsed_uri.scheme, parsed_uri.netloc, parsed_uri.path or "/"
+
+
+def get_content_hash(document_graph: DocumentGraph, prefixes: str) -> str:
+    """Hashes the public triples of a document in their canonical order, together
+    with the prefixes they are written with, which identifies every serialization
+    of the document without serializing it."""
+
+    content_hash = sha256(prefixes.encode("utf-8"), usedforsecurity=False)
+
+    for chunk in iter_chunks(
+        iter_ntriples(document_graph), chunk_size=STREAM_CHUNK_SIZE
+    ):
+        content_hash.update(chunk)
+
+    return content_hash.hexdigest()[:32]
+
+
+def find_document_template(
+    document_uri: URIRef,
+    graph: DocumentGraph | Graph,
+    app_templates: Dict[str, Dict[str, str]],
+) -> Tuple[str | None, str | None]:
+    """Locates the template of a document from its types."""
+
+    return find_template(
+        uri=document_uri,
+        type_uris=(
+            u
+            for u in graph.objects(
+                subject=document_uri, predicate=RDF.type, unique=True
+            )
+            if isinstance(u, URIRef)
+        ),
+        app_templates=app_templates,
+    )
+
+
+def compile_route(
+    document_uri: URIRef,
+    graph: DocumentGraph | Graph,
+    app_templates: Dict[str, Dict[str, str]],
+    source_modified: datetime,
+    content_hash: str | None = None,
+) -> DocumentRoute:
+    """Resolves the response plan of a document from the triples about it."""
+
+    last_modified = get_document_modified(
+        document_uri=document_uri,
+        document_graph=graph,
+        source_modified=source_modified,
+    )
+    same_as = graph.value(subject=document_uri, predicate=OWL.sameAs)
+    template_name, template_type = find_document_template(
+        document_uri=document_uri,
+        graph=graph,
+        app_templates=app_templates,
+    )
+
+    is_media = (document_uri, RDF.type, SDO.MediaObject) in graph
+    media_mimetype = graph.value(subject=document_uri, predicate=SDO.encodingFormat)
+    media_uri = graph.value(subject=document_uri, predicate=SDO.contentUrl)
+
+    if is_media and not (
+        isinstance(media_mimetype, Literal) and isinstance(media_uri, URIRef)
+    ):
+        error(
+            "Missing schema:encodingFormat or schema:contentUrl"
+            f" on {document_uri.n3()}, serving it as RDF only"
+        )
+        is_media = False
+
+    # A schema:MediaObject prefers its on-disk file mimetype over everything else
+    if not is_media:
+        return DocumentRoute(
+            document_uri=document_uri,
+            mimetypes=ACCEPT_MIMETYPES,
+            last_modified=last_modified,
+            redirect=same_as if isinstance(same_as, URIRef) else None,
+            template_name=template_name,
+            template_type=template_type,
+            content_hash=content_hash,
+        )
+
+    media_sha256 = graph.value(subject=document_uri, predicate=SDO.sha256)
+
+    return DocumentRoute(
+        document_uri=document_uri,
+        mimetypes=(
+            str(media_mimetype),
+            *(m for m in ACCEPT_MIMETYPES if m != "text/html"),
+        ),
+        last_modified=last_modified,
+        redirect=same_as if isinstance(same_as, URIRef) else None,
+        media_mimetype=str(media_mimetype),
+        media_path=uri_to_path(media_uri).as_posix(),
+        media_etag=str(media_sha256)[:32] if media_sha256 else None,
+        content_hash=content_hash,
+    )
+
+
+def compile_routes(
+    document_datasets: DocumentDatasets,
+    app_templates: Dict[str, Dict[str, str]],
+    previous_routes: Dict[RouteKey, DocumentRoute] | None = None,
+    changed_documents: Set[URIRef] | None = None,
+) -> Dict[RouteKey, DocumentRoute]:
+    """Resolves the response plans of all documents, keyed by their request URI,
+    with the content hashes of the documents unless they are collected lazily.
+    Given the routes of the previous datasets, only the changed documents are
+    resolved again, and the other documents keep their routes. Documents without
+    known sources get the latest modification time of all documents."""
+
+    routes: Dict[RouteKey, DocumentRoute] = {}
+    document_uris: Iterable[URIRef] = document_datasets
+    prefixes = "".join(
+        get_prefix_map(document_datasets.namespace_manager).iter_turtle_prefixes()
+    )
+    documents_modified = document_datasets.modified
+    latest_modified = max(documents_modified.values(), default=0)
+
+    if previous_routes is not None and changed_documents is not None:
+        routes = {
+            k: r
+            for k, r in previous_routes.items()
+            if r.document_uri not in changed_documents
+            and r.document_uri in document_datasets
+        }
+        document_uris = (u for u in changed_documents if u in document_datasets)
+
+    for document_uri in document_uris:
+        # The file URIs of media are only found among the private triples
+        routes[get_route_key(document_uri)] = compile_route(
+            document_uri=document_uri,
+            graph=document_datasets.get_private(document_uri),
+            app_templates=app_templates,
+            source_modified=datetime.fromtimestamp(
+                documents_modified.get(document_uri, latest_modified), tz=timezone.utc
+            ),
+            content_hash=(
+                get_content_hash(document_datasets[document_uri], prefixes)
+                if isinstance(document_datasets, DocumentStore)
+                else None
+            ),
+        )
+
+    return routes
+
+
+def assign_templates(
+    routes: Dict[RouteKey, DocumentRoute],
+    document_datasets: DocumentDatasets,
+    app_templates: Dict[str, Dict[str, str]],
+) -> Dict[RouteKey, DocumentRoute]:
+    """Locates the templates of the routes again after the templates have changed,
+    keeping everything else, including the content hashes."""
+
+    assigned_routes: Dict[RouteKey, DocumentRoute] = {}
+
+    for route_key, route in routes.items():
+        # A schema:MediaObject is not rendered with a template
+        if not route.media_mimetype:
+            template_name, template_type = find_document_template(
+                document_uri=route.document_uri,
+                graph=document_datasets.get_private(route.document_uri),
+                app_templates=app_templates,
+            )
+            route = route._replace(
+                template_name=template_name, template_type=template_type
+            )
+        assigned_routes[route_key] = route
+
+    return assigned_routes
+
+
+@lru_cache(maxsize=NEGOTIATION_CACHE_SIZE)
+def negotiate_mimetype(accept_header: str, mimetypes: Tuple[str, ...]) -> str | None:
+    """Selects the best mimetype for the Accept header, or the first one when the
+    client has no preference, remembering the results for repeated headers."""
+
+    accept_mimetypes = parse_accept_header(accept_header, MIMEAccept)
+
+    if not accept_mimetypes.provided:
+        return mimetypes[0]
+
+    return accept_mimetypes.best_match(mimetypes)
@@ -0,0 +1,354 @@
+"""Serialization of document graphs without building intermediate graphs."""
+
+from re import compile as re_compile
+from json import dumps
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Iterable
+from typing import Iterator
+from functools import partial
+from functools import lru_cache
+from itertools import chain
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+from rdflib.term import Node
+from rdflib.term import BNode
+from rdflib.term import URIRef
+from rdflib.term import Literal
+from rdflib.graph import Graph
+from rdflib.graph import _TripleType
+from rdflib.namespace import RDF
+from rdflib.namespace import NamespaceManager
+from rdflib.plugins.serializers.nt import _nt_row
+
+from store import DocumentGraph
+
+# The size in bytes above which the buffered output of a stream is sent
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# The RDFLib format keywords that can be streamed
+STREAMING_FORMATS: Tuple[str, ...] = ("nt11", "turtle")
+
+# The number of namespace managers to keep precomputed prefix lookups for
+PREFIX_MAP_CACHE_SIZE = 16
+
+# Local names that are safe to write as Turtle prefixed names, a subset of PN_LOCAL
+TURTLE_LOCAL_NAME = re_compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+
+# Prefixes that are safe to write in Turtle, a subset of PN_PREFIX
+TURTLE_PREFIX = re_compile(r"([A-Za-z][A-Za-z0-9_-]*)?")
+
+# Characters escaped in RDF/XML text beyond the markup ones, which XML parsers
+# would otherwise normalize
+XML_ENTITIES: Dict[str, str] = {"\r": "&#13;"}
+
+# Names that are safe to write as XML element names and node IDs, a subset of NCName
+XML_NAME = re_compile(r"[A-Za-z_][A-Za-z0-9_.-]*")
+
+
+class PrefixMap:
+    """Precomputed lookup of namespace prefixes, splitting URIs at their last
+    slash or hash instead of going through the namespace manager, which caches
+    every URI it sees and is shared between requests."""
+
+    def __init__(self, namespaces: Iterable[Tuple[str, URIRef]]) -> None:
+        self.prefixes: Dict[str, str] = {}
+
+        for prefix, namespace in namespaces:
+            if TURTLE_PREFIX.fullmatch(prefix) and str(namespace)[-1:] in "/#":
+                self.prefixes.setdefault(str(namespace), prefix)
+
+    def qname(self, uri: str, used_prefixes: Set[str] | None = None) -> str | None:
+        """Returns the prefixed name of the URI, or None if it has no prefix,
+        adding the prefix to the used prefixes when given."""
+
+        split = max(uri.rfind("/"), uri.rfind("#")) + 1
+        prefix = self.prefixes.get(uri[:split])
+
+        if prefix is None or not TURTLE_LOCAL_NAME.fullmatch(uri, split):
+            return None
+
+        if used_prefixes is not None:
+            used_prefixes.add(prefix)
+
+        return f"{prefix}:{uri[split:]}"
+
+    def turtle_term(self, term: Node, used_prefixes: Set[str] | None = None) -> str:
+        """Writes a term in Turtle, using prefixed names where possible."""
+
+        if isinstance(term, Literal):
+            return term._literal_n3(  # pylint: disable=protected-access
+                use_plain=True,
+                qname_callback=partial(self.qname, used_prefixes=used_prefixes),
+            )
+
+        if isinstance(term, URIRef):
+            return self.qname(term, used_prefixes) or term.n3()
+
+        return term.n3()
+
+    def iter_turtle_prefixes(
+        self, used_prefixes: Set[str] | None = None
+    ) -> Iterator[str]:
+        """Generates the prefix declarations of the used namespaces, or of all of
+        them when the used prefixes are not known."""
+
+        for namespace, prefix in self.prefixes.items():
+            if used_prefixes is None or prefix in used_prefixes:
+                yield f"@prefix {prefix}: <{namespace}> .\n"
+
+
+@lru_cache(maxsize=PREFIX_MAP_CACHE_SIZE)
+def get_prefix_map(namespace_manager: NamespaceManager) -> PrefixMap:
+    """Precomputes the prefix lookup of the namespaces shared by all documents."""
+
+    return PrefixMap(namespace_manager.namespaces())
+
+
+def iter_ntriples(triples: Iterable[_TripleType]) -> Iterator[str]:
+    """Generates N-Triples one line per triple, exactly like RDFLib."""
+
+    for triple in triples:
+        yield _nt_row(triple)
+
+
+def iter_turtle(
+    triples: Iterable[_TripleType],
+    prefix_map: PrefixMap,
+    used_prefixes: Set[str] | None = None,
+) -> Iterator[str]:
+    """Generates Turtle statements one subject block at a time, starting a new
+    block whenever the subject changes, which may describe a subject in more
+    than one block."""
+
+    turtle_term = partial(prefix_map.turtle_term, used_prefixes=used_prefixes)
+    last_s: Node | None = None
+    last_p: Node | None = None
+
+    for s, p, o in triples:
+        o_string = turtle_term(o)
+        if s != last_s:
+            if last_s is not None:
+                yield " .\n"
+            p_string = "a" if p == RDF.type else turtle_term(p)
+            yield f"\n{turtle_term(s)}\n    {p_string} {o_string}"
+        elif p != last_p:
+            p_string = "a" if p == RDF.type else turtle_term(p)
+            yield f" ;\n    {p_string} {o_string}"
+        else:
+            yield f" ,\n        {o_string}"
+        last_s, last_p = s, p
+
+    if last_s is not None:
+        yield " .\n"
+
+
+def write_turtle(triples: Iterable[_TripleType], prefix_map: PrefixMap) -> str:
+    """Writes Turtle, declaring only the prefixes that are used."""
+
+    used_prefixes: Set[str] = set()
+    statements = "".join(iter_turtle(triples, prefix_map, used_prefixes))
+
+    return "".join(prefix_map.iter_turtle_prefixes(used_prefixes)) + statements
+
+
+def get_json_ld_id(term: Node) -> str:
+    """Returns the JSON-LD identifier of a URI or blank node."""
+
+    return term.n3() if isinstance(term, BNode) else str(term)
+
+
+def get_json_ld_value(term: Node) -> Dict[str, str]:
+    """Returns the JSON-LD value object of a term."""
+
+    if not isinstance(term, Literal):
+        return {"@id": get_json_ld_id(term)}
+
+    if term.language:
+        return {"@value": str(term), "@language": term.language}
+
+    if term.datatype:
+        return {"@value": str(term), "@type": str(term.datatype)}
+
+    return {"@value": str(term)}
+
+
+def write_json_ld(triples: Iterable[_TripleType]) -> str:
+    """Writes expanded JSON-LD with one node object per subject, like RDFLib
+    without a context, keeping literal values as strings."""
+
+    node_objects: Dict[Node, Dict[str, List[Any]]] = {}
+
+    for s, p, o in triples:
+        node_object = node_objects.get(s)
+        if node_object is None:
+            node_object = node_objects[s] = {"@id": get_json_ld_id(s)}  # type: ignore
+        if p == RDF.type and not isinstance(o, Literal):
+            node_object.setdefault("@type", []).append(get_json_ld_id(o))
+        else:
+            node_object.setdefault(str(p), []).append(get_json_ld_value(o))
+
+    return dumps(list(node_objects.values()), ensure_ascii=False)
+
+
+def get_xml_node_attribute(term: Node, name: str) -> str | None:
+    """Returns the attribute referring to a URI or blank node in RDF/XML, or None
+    if the blank node identifier is not a valid node ID."""
+
+    if isinstance(term, BNode):
+        return f'rdf:nodeID="{term}"' if XML_NAME.fullmatch(term) else None
+
+    return f"rdf:{name}={quoteattr(term)}"
+
+
+def get_xml_name(
+    uri: URIRef,
+    prefix_map: PrefixMap,
+    namespaces: Dict[str, str],
+) -> str | None:
+    """Returns the element name of a predicate, adding its namespace to the used
+    ones, or None when the URI cannot be split into a namespace and a name."""
+
+    split = max(uri.rfind("/"), uri.rfind("#")) + 1
+
+    if not XML_NAME.fullmatch(uri, split):
+        return None
+
+    namespace = uri[:split]
+    prefix = namespaces.get(namespace)
+
+    if prefix is None:
+        prefix = prefix_map.prefixes.get(namespace)
+        # Generate a prefix for unbound namespaces or the default namespace
+        index = len(namespaces)
+        while not prefix or prefix in namespaces.values():
+            prefix = f"ns{index}"
+            index += 1
+        namespaces[namespace] = prefix
+
+    return f"{prefix}:{uri[split:]}"
+
+
+def get_xml_property_element(name: str, term: Node) -> str | None:
+    """Returns the property element of an object in RDF/XML, or None when the
+    object cannot be written in this form."""
+
+    if not isinstance(term, Literal):
+        attribute = get_xml_node_attribute(term, "resource")
+        return None if attribute is None else f"    <{name} {attribute}/>\n"
+
+    if term.datatype == RDF.XMLLiteral:
+        return None
+
+    if term.language:
+        attributes = f" xml:lang={quoteattr(term.language)}"
+    elif term.datatype:
+        attributes = f" rdf:datatype={quoteattr(term.datatype)}"
+    else:
+        attributes = ""
+
+    return f"    <{name}{attributes}>{escape(term, XML_ENTITIES)}</{name}>\n"
+
+
+def write_rdf_xml(triples: Iterable[_TripleType], prefix_map: PrefixMap) -> str | None:
+    """Writes flat RDF/XML with one description per subject block, or returns None
+    when a term cannot be written in this form."""
+
+    namespaces: Dict[str, str] = {str(RDF): "rdf"}
+    elements: List[str] = []
+    last_s: Node | None = None
+
+    for s, p, o in triples:
+        if s != last_s:
+            s_attribute = get_xml_node_attribute(s, "about")
+            if s_attribute is None:
+                return None
+            if last_s is not None:
+                elements.append("  </rdf:Description>\n")
+            elements.append(f"  <rdf:Description {s_attribute}>\n")
+            last_s = s
+        name = get_xml_name(p, prefix_map, namespaces)  # type: ignore[arg-type]
+        if name is None:
+            return None
+        element = get_xml_property_element(name, o)
+        if element is None:
+            return None
+        elements.append(element)
+
+    if last_s is not None:
+        elements.append("  </rdf:Description>\n")
+
+    declarations = "".join(
+        f"  xmlns:{p}={quoteattr(n)}\n" for n, p in namespaces.items()
+    )
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        f"<rdf:RDF\n{declarations}>\n{''.join(elements)}</rdf:RDF>\n"
+    )
+
+
+def serialize_document(
+    document_graph: DocumentGraph | Graph, format_keyword: str
+) -> bytes:
+    """Serializes a document into UTF-8 with the lean writers of the supported
+    formats, falling back to RDFLib for other formats or unusual terms."""
+
+    prefix_map = get_prefix_map(document_graph.namespace_manager)
+    body: str | None = None
+
+    if format_keyword == "nt11":
+        body = "".join(iter_ntriples(document_graph))
+    elif format_keyword in ("turtle", "n3"):
+        body = write_turtle(document_graph, prefix_map)
+    elif format_keyword == "json-ld":
+        body = write_json_ld(document_graph)
+    elif format_keyword == "pretty-xml":
+        body = write_rdf_xml(document_graph, prefix_map)
+
+    if body is None:
+        return document_graph.serialize(format=format_keyword, encoding="utf-8")
+
+    return body.encode("utf-8")
+
+
+def iter_chunks(strings: Iterable[str], chunk_size: int) -> Iterator[bytes]:
+    """Joins small strings into encoded chunks of roughly the given size."""
+
+    buffer = []
+    buffer_size = 0
+
+    for string in strings:
+        buffer.append(string)
+        buffer_size += len(string)
+        if buffer_size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            buffer_size = 0
+
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def stream_document(
+    document_graph: DocumentGraph, format_keyword: str
+) -> Iterator[bytes]:
+    """Serializes a document in chunks, holding only one chunk in memory at a time."""
+
+    assert format_keyword in STREAMING_FORMATS, f"Cannot stream {format_keyword}"
+
+    if format_keyword == "nt11":
+        strings = iter_ntriples(document_graph)
+    else:
+        # Declare all prefixes up front, as finding the used ones takes a full pass
+        prefix_map = get_prefix_map(document_graph.namespace_manager)
+        strings = chain(
+            prefix_map.iter_turtle_prefixes(),
+            iter_turtle(document_graph, prefix_map),
+        )
+
+    return iter_chunks(strings, chunk_size=STREAM_CHUNK_SIZE)
@@ -0,0 +1,119 @@
+"""Persistent snapshots of the prepared application data."""
+
+from os import replace
+from json import dumps
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+from pickle import load
+from pickle import dump
+from pickle import HIGHEST_PROTOCOL
+from pathlib import Path
+from hashlib import sha256
+from logging import info
+from logging import warning
+
+from constants import RDF_FILE_EXTENSIONS
+from constants import SPARQL_FILE_EXTENSIONS
+from utils import get_file_sha256sum
+from store import DocumentStore
+from store import get_namespace_manager
+
+# Incremented whenever the snapshot contents change in an incompatible way
+SNAPSHOT_VERSION = 4
+
+
+def get_manifest(data_path: Path, queries_path: Path) -> Dict[str, Any]:
+    """Describes the input files that the prepared data is derived from."""
+
+    files: List[Dict[str, Any]] = []
+
+    for root in (data_path, queries_path):
+        for path in sorted(p for p in root.rglob("*") if p.is_file()):
+            path_stat = path.stat()
+            entry: Dict[str, Any] = {
+                "path": path.as_posix(),
+                "size": path_stat.st_size,
+                "mtime_ns": path_stat.st_mtime_ns,
+            }
+            # Hash the RDF and query files, and rely on size and mtime for the rest
+            if (
+                path.suffix in RDF_FILE_EXTENSIONS
+                or path.suffix in SPARQL_FILE_EXTENSIONS
+            ):
+                entry["sha256"] = get_file_sha256sum(path=path)
+            files.append(entry)
+
+    return {"version": SNAPSHOT_VERSION, "files": files}
+
+
+def get_manifest_digest(manifest: Dict[str, Any]) -> str:
+    """Generates a stable digest of the manifest for comparing snapshots."""
+
+    manifest_bytes = dumps(manifest, sort_keys=True).encode("utf-8")
+
+    return sha256(manifest_bytes, usedforsecurity=False).hexdigest()
+
+
+def load_snapshot(path: Path) -> Tuple[str | None, DocumentStore]:
+    """Loads the digest and the document datasets of a snapshot, up to date or not."""
+
+    with open(path, "rb") as snapshot_file:
+        snapshot = load(snapshot_file)
+
+    return snapshot.get("digest"), DocumentStore(
+        namespace_manager=get_namespace_manager(snapshot["namespaces"]),
+        term_table=snapshot["term_table"],
+        documents=snapshot["documents"],
+        private_documents=snapshot["private_documents"],
+        modified=snapshot["modified"],
+    )
+
+
+def read_snapshot(path: Path, digest: str) -> DocumentStore | None:
+    """Loads the document datasets, if the snapshot is up to date."""
+
+    if not path.is_file():
+        info(f"No snapshot found at {path}")
+        return None
+
+    snapshot_digest, document_datasets = load_snapshot(path=path)
+
+    if snapshot_digest != digest:
+        info(f"Snapshot at {path} is outdated")
+        return None
+
+    info(f"Loaded {document_datasets.triple_count} triples from snapshot at {path}")
+
+    return document_datasets
+
+
+def write_snapshot(
+    path: Path,
+    digest: str,
+    document_datasets: DocumentStore,
+) -> None:
+    """Stores the document datasets for the given manifest digest."""
+
+    snapshot = {
+        "digest": digest,
+        "namespaces": list(document_datasets.namespace_manager.namespaces()),
+        "term_table": document_datasets.term_table,
+        "documents": document_datasets.documents,
+        "private_documents": document_datasets.private_documents,
+        "modified": document_datasets.modified,
+    }
+
+    # Write into a temporary file first, to never leave a partial snapshot behind
+    temporary_path = path.with_name(f"{path.name}.tmp")
+
+    try:
+        with open(temporary_path, "wb") as snapshot_file:
+            dump(snapshot, snapshot_file, protocol=HIGHEST_PROTOCOL)
+        replace(temporary_path, path)
+    except OSError as ex:
+        warning(f"Unable to write snapshot to {path}: {ex}")
+        return
+
+    info(f"Wrote snapshot of {document_datasets.triple_count} triples to {path}")
@@ -0,0 +1,701 @@
+"""Compact read-only storage of the document datasets."""
+
+from array import array
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Iterable
+from typing import Iterator
+from typing import Mapping
+from typing import Set
+from hashlib import sha256
+from logging import info
+from threading import Lock
+from collections import OrderedDict
+
+from rdflib.term import Node
+from rdflib.term import BNode
+from rdflib.term import URIRef
+from rdflib.term import Literal
+from rdflib.graph import Graph
+from rdflib.graph import _TripleType
+from rdflib.graph import _SubjectType
+from rdflib.graph import _PredicateType
+from rdflib.graph import _ObjectType
+from rdflib.namespace import RDF
+from rdflib.namespace import NamespaceManager
+from rdflib.exceptions import UniquenessError
+
+from utils import is_private_triple
+from utils import sort_by_predicate
+from utils import group_by_predicate
+
+# The array type code of term IDs, allowing for up to four billion distinct terms
+TERM_ID_TYPECODE = "I"
+
+# The share of terms a term table may grow by through reloads before it is
+# rebuilt without the terms of the replaced documents
+TERM_TABLE_SLACK = 0.25
+
+# A triple pattern, where None matches any term
+_TriplePatternType = Tuple[
+    _SubjectType | None,
+    _PredicateType | None,
+    _ObjectType | None,
+]
+
+
+class TermTable:
+    """Interns RDF terms into integer IDs shared by all documents."""
+
+    def __init__(self) -> None:
+        self.terms: List[Node] = []
+        self.ids: Dict[Node, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def intern(self, term: Node) -> int:
+        """Returns the ID of the term, assigning a new one if it was not seen yet."""
+
+        term_id = self.ids.get(term)
+
+        if term_id is None:
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.ids[term] = term_id
+
+        return term_id
+
+
+def get_term_sort_key(term: Node) -> Tuple[int, str, str]:
+    """Orders URIs before blank nodes and literals, and literals by their value,
+    datatype and language, independently of how the terms were parsed."""
+
+    if isinstance(term, Literal):
+        return 2, str(term), f"{term.datatype or ''}@{term.language or ''}"
+
+    return (1 if isinstance(term, BNode) else 0), str(term), ""
+
+
+def get_blank_node_signature(
+    blank_node: BNode,
+    outgoing: Dict[BNode, List[Tuple[Node, Node]]],
+    signatures: Dict[BNode, str],
+    visiting: Set[BNode],
+) -> str:
+    """Hashes the triples of a blank node, together with those of the blank nodes
+    it refers to, without depending on the labels of any of them."""
+
+    signature = signatures.get(blank_node)
+
+    if signature is not None:
+        return signature
+
+    if blank_node in visiting:
+        return "cycle"
+
+    visiting.add(blank_node)
+    statements = sorted(
+        f"{p.n3()} "
+        + (
+            get_blank_node_signature(o, outgoing, signatures, visiting)
+            if isinstance(o, BNode)
+            else o.n3()
+        )
+        for p, o in outgoing.get(blank_node, ())
+    )
+    visiting.discard(blank_node)
+
+    signature = signatures[blank_node] = sha256(
+        "\n".join(statements).encode("utf-8"), usedforsecurity=False
+    ).hexdigest()
+
+    return signature
+
+
+def relabel_blank_nodes(
+    document_uri: URIRef,
+    triples: List[_TripleType],
+) -> List[_TripleType]:
+    """Replaces the blank node labels, which are random with every parse, with
+    labels derived from the triples around the blank nodes in the document."""
+
+    outgoing: Dict[BNode, List[Tuple[Node, Node]]] = {}
+    incoming: Dict[BNode, List[str]] = {}
+
+    for s, p, o in triples:
+        if isinstance(s, BNode):
+            outgoing.setdefault(s, []).append((p, o))
+        if isinstance(o, BNode):
+            incoming.setdefault(o, []).append(
+                f"{'' if isinstance(s, BNode) else s.n3()} {p.n3()}"
+            )
+
+    if not outgoing and not incoming:
+        return triples
+
+    signatures: Dict[BNode, str] = {}
+    labels: Dict[BNode, BNode] = {}
+    seen: Dict[str, int] = {}
+
+    for blank_node in outgoing.keys() | incoming.keys():
+        signature = get_blank_node_signature(blank_node, outgoing, signatures, set())
+        key = "\n".join(
+            (document_uri, signature, *sorted(incoming.get(blank_node, ())))
+        )
+        # Blank nodes with identical surroundings are interchangeable
+        seen[key] = seen.get(key, -1) + 1
+        # Start with a letter, so that the labels are also valid XML names
+        labels[blank_node] = BNode(
+            "b"
+            + sha256(
+                f"{key}\n{seen[key]}".encode("utf-8"), usedforsecurity=False
+            ).hexdigest()[:32]
+        )
+
+    return [
+        (
+            labels.get(s, s),  # type: ignore[arg-type]
+            p,
+            labels.get(o, o),  # type: ignore[arg-type]
+        )
+        for s, p, o in triples
+    ]
+
+
+def compact_term_table(
+    term_table: TermTable,
+    *document_maps: Dict[URIRef, array],
+) -> Tuple[TermTable, List[Dict[URIRef, array]]]:
+    """Interns the terms of the documents into a new table, leaving out the terms
+    that no document refers to anymore, and returns the remapped documents."""
+
+    compacted_table = TermTable()
+    term_ids = [-1] * len(term_table)
+
+    for documents in document_maps:
+        for triple_ids in documents.values():
+            for term_id in triple_ids:
+                if term_ids[term_id] < 0:
+                    term_ids[term_id] = compacted_table.intern(
+                        term_table.terms[term_id]
+                    )
+
+    return compacted_table, [
+        {u: array(TERM_ID_TYPECODE, map(term_ids.__getitem__, i)) for u, i in d.items()}
+        for d in document_maps
+    ]
+
+
+def get_namespace_manager(namespaces: Iterable[Tuple[str, Any]]) -> NamespaceManager:
+    """Creates a namespace manager with exactly the given prefix bindings, that
+    does not keep the graph the bindings were taken from alive."""
+
+    graph = Graph(bind_namespaces="none")
+
+    for prefix, namespace in namespaces:
+        graph.bind(prefix=prefix, namespace=namespace, override=True, replace=True)
+
+    return graph.namespace_manager
+
+
+class DocumentGraph:
+    """Read-only view of the triples of a document, with the lookups used when
+    serving documents and rendering templates, and conversion into a graph."""
+
+    __slots__ = ("identifier", "namespace_manager", "term_table", "triple_ids")
+
+    def __init__(
+        self,
+        identifier: URIRef,
+        namespace_manager: NamespaceManager,
+        term_table: TermTable,
+        triple_ids: array,
+    ) -> None:
+        self.identifier = identifier
+        self.namespace_manager = namespace_manager
+        self.term_table = term_table
+        self.triple_ids = triple_ids
+
+    def __len__(self) -> int:
+        return len(self.triple_ids) // 3
+
+    def __iter__(self) -> Iterator[_TripleType]:
+        return self.triples((None, None, None))
+
+    def __contains__(self, triple: _TriplePatternType) -> bool:
+        return next(self.triples(triple), None) is not None
+
+    def triples(self, triple: _TriplePatternType) -> Iterator[_TripleType]:
+        """Generates the triples matching the pattern."""
+
+        ids = self.term_table.ids
+        s_id, p_id, o_id = (None if t is None else ids.get(t, -1) for t in triple)
+
+        # Terms that were never interned cannot match any triple
+        if -1 in (s_id, p_id, o_id):
+            return
+
+        terms = self.term_table.terms
+        triple_ids = self.triple_ids
+
+        for s, p, o in zip(triple_ids[0::3], triple_ids[1::3], triple_ids[2::3]):
+            if s_id is not None and s != s_id:
+                continue
+            if p_id is not None and p != p_id:
+                continue
+            if o_id is not None and o != o_id:
+                continue
+            yield terms[s], terms[p], terms[o]  # type: ignore[misc]
+
+    def subjects(
+        self,
+        predicate: _PredicateType | None = None,
+        object: _ObjectType | None = None,  # pylint: disable=redefined-builtin
+        unique: bool = False,
+    ) -> Iterator[_SubjectType]:
+        """Generates the subjects with the given predicate and object."""
+
+        subjects = (s for s, _, _ in self.triples((None, predicate, object)))
+
+        return iter(dict.fromkeys(subjects)) if unique else subjects
+
+    def predicates(
+        self,
+        subject: _SubjectType | None = None,
+        object: _ObjectType | None = None,  # pylint: disable=redefined-builtin
+        unique: bool = False,
+    ) -> Iterator[_PredicateType]:
+        """Generates the predicates with the given subject and object."""
+
+        predicates = (p for _, p, _ in self.triples((subject, None, object)))
+
+        return iter(dict.fromkeys(predicates)) if unique else predicates
+
+    def objects(
+        self,
+        subject: _SubjectType | None = None,
+        predicate: _PredicateType | None = None,
+        unique: bool = False,
+    ) -> Iterator[_ObjectType]:
+        """Generates the objects with the given subject and predicate."""
+
+        objects = (o for _, _, o in self.triples((subject, predicate, None)))
+
+        return iter(dict.fromkeys(objects)) if unique else objects
+
+    def subject_predicates(
+        self,
+        object: _ObjectType | None = None,  # pylint: disable=redefined-builtin
+        unique: bool = False,
+    ) -> Iterator[Tuple[_SubjectType, _PredicateType]]:
+        """Generates the subject and predicate pairs with the given object."""
+
+        pairs = ((s, p) for s, p, _ in self.triples((None, None, object)))
+
+        return iter(dict.fromkeys(pairs)) if unique else pairs
+
+    def subject_objects(
+        self,
+        predicate: _PredicateType | None = None,
+        unique: bool = False,
+    ) -> Iterator[Tuple[_SubjectType, _ObjectType]]:
+        """Generates the subject and object pairs with the given predicate."""
+
+        pairs = ((s, o) for s, _, o in self.triples((None, predicate, None)))
+
+        return iter(dict.fromkeys(pairs)) if unique else pairs
+
+    def predicate_objects(
+        self,
+        subject: _SubjectType | None = None,
+        unique: bool = False,
+    ) -> Iterator[Tuple[_PredicateType, _ObjectType]]:
+        """Generates the predicate and object pairs with the given subject."""
+
+        pairs = ((p, o) for _, p, o in self.triples((subject, None, None)))
+
+        return iter(dict.fromkeys(pairs)) if unique else pairs
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def value(
+        self,
+        subject: _SubjectType | None = None,
+        predicate: _PredicateType | None = RDF.value,
+        object: _ObjectType | None = None,  # pylint: disable=redefined-builtin
+        default: Node | None = None,
+        any: bool = True,  # pylint: disable=redefined-builtin
+    ) -> Node | None:
+        """Returns a single term matching the other two, like Graph.value."""
+
+        if (subject, predicate, object).count(None) != 1:
+            return None
+
+        if object is None:
+            values: Iterator[Node] = self.objects(subject, predicate)
+        elif subject is None:
+            values = self.subjects(predicate, object)
+        else:
+            values = self.predicates(subject, object)
+
+        retval = next(values, default)
+
+        if not any and retval is not default and next(values, None) is not None:
+            raise UniquenessError(values)
+
+        return retval
+
+    def namespaces(self) -> Iterator[Tuple[str, URIRef]]:
+        """Generates the prefix bindings shared by all documents."""
+
+        return self.namespace_manager.namespaces()
+
+    def to_graph(self) -> Graph:
+        """Copies the triples into a new graph, for serialization or modification."""
+
+        graph = Graph(
+            identifier=self.identifier, namespace_manager=self.namespace_manager
+        )
+        graph.addN((s, p, o, graph) for s, p, o in self)
+
+        return graph
+
+    def serialize(self, *args, **kwargs) -> Any:
+        """Serializes the document through a graph, like Graph.serialize."""
+
+        return self.to_graph().serialize(*args, **kwargs)
+
+    def indexed(self) -> "IndexedDocumentGraph":
+        """Indexes the triples for rendering templates with many lookups."""
+
+        return IndexedDocumentGraph(
+            identifier=self.identifier,
+            namespace_manager=self.namespace_manager,
+            term_table=self.term_table,
+            triple_ids=self.triple_ids,
+        )
+
+
+class IndexedDocumentGraph(DocumentGraph):
+    """Read-only view of the triples of a document, indexed by subject and by
+    object, so that lookups with a bound subject or object do not scan all
+    triples. Built once for rendering a template, with helpers for sorting and
+    grouping subjects."""
+
+    __slots__ = ("subject_index", "object_index")
+
+    def __init__(
+        self,
+        identifier: URIRef,
+        namespace_manager: NamespaceManager,
+        term_table: TermTable,
+        triple_ids: array,
+    ) -> None:
+        super().__init__(identifier, namespace_manager, term_table, triple_ids)
+
+        # Offsets of the triples of each term, keeping the order of the document
+        self.subject_index: Dict[int, List[int]] = {}
+        self.object_index: Dict[int, List[int]] = {}
+
+        for offset in range(0, len(triple_ids), 3):
+            self.subject_index.setdefault(triple_ids[offset], []).append(offset)
+            self.object_index.setdefault(triple_ids[offset + 2], []).append(offset)
+
+    def triples(self, triple: _TriplePatternType) -> Iterator[_TripleType]:
+        """Generates the triples matching the pattern, through the index of the
+        bound subject or object when there is one."""
+
+        if triple[0] is None and triple[2] is None:
+            yield from super().triples(triple)
+            return
+
+        ids = self.term_table.ids
+        s_id, p_id, o_id = (None if t is None else ids.get(t, -1) for t in triple)
+
+        if -1 in (s_id, p_id, o_id):
+            return
+
+        terms = self.term_table.terms
+        triple_ids = self.triple_ids
+        offsets = (
+            self.subject_index.get(s_id, [])
+            if s_id is not None
+            else self.object_index.get(o_id, [])  # type: ignore[arg-type]
+        )
+
+        for offset in offsets:
+            s, p, o = triple_ids[offset : offset + 3]
+            if s_id is not None and s != s_id:
+                continue
+            if p_id is not None and p != p_id:
+                continue
+            if o_id is not None and o != o_id:
+                continue
+            yield terms[s], terms[p], terms[o]  # type: ignore[misc]
+
+    def first_value(
+        self,
+        subject: _SubjectType,
+        predicate: _PredicateType,
+        default: Node | None = None,
+    ) -> Node | None:
+        """Returns the first object of the subject and predicate, or the default."""
+
+        return next(self.objects(subject=subject, predicate=predicate), default)
+
+    def sort_by(
+        self,
+        subjects: Iterable[_SubjectType],
+        predicate: _PredicateType,
+        reverse: bool = False,
+    ) -> List[_SubjectType]:
+        """Sorts the subjects by their first value of the predicate."""
+
+        return sort_by_predicate(subjects, self, predicate, reverse)  # type: ignore
+
+    def group_by(
+        self,
+        subjects: Iterable[_SubjectType],
+        predicate: _PredicateType,
+    ) -> Dict[_ObjectType | None, List[_SubjectType]]:
+        """Groups the subjects by each of their values of the predicate."""
+
+        return group_by_predicate(subjects, self, predicate)  # type: ignore
+
+
+class DocumentStore(Mapping[URIRef, DocumentGraph]):
+    """Read-only mapping of document URIs to their public triples, held as arrays of
+    term IDs into a table shared by all documents, instead of a graph per document.
+    The triples referring to file URIs are held apart, and only used for resolving
+    the files to serve."""
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        namespace_manager: NamespaceManager,
+        term_table: TermTable | None = None,
+        documents: Dict[URIRef, array] | None = None,
+        private_documents: Dict[URIRef, array] | None = None,
+        compacted_terms: int | None = None,
+        modified: Dict[URIRef, float] | None = None,
+    ) -> None:
+        self.namespace_manager = namespace_manager
+        self.term_table = term_table or TermTable()
+        self.documents: Dict[URIRef, array] = documents or {}
+        self.private_documents: Dict[URIRef, array] = private_documents or {}
+        # The latest modification times of the source files of the documents
+        self.modified: Dict[URIRef, float] = modified or {}
+        # The size of the term table when it last held only referenced terms
+        self.compacted_terms = compacted_terms
+
+    def __getitem__(self, key: URIRef) -> DocumentGraph:
+        return DocumentGraph(
+            identifier=key,
+            namespace_manager=self.namespace_manager,
+            term_table=self.term_table,
+            triple_ids=self.documents[key],
+        )
+
+    def __iter__(self) -> Iterator[URIRef]:
+        return iter(self.documents)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.documents
+
+    def add(
+        self,
+        document_uri: URIRef,
+        triples: Iterable[_TripleType],
+        relabel: bool = True,
+    ) -> None:
+        """Stores the triples of a document, replacing any previous ones, grouped by
+        subject and predicate so that they can be written in blocks, and splitting
+        off the private ones. The triples are put in a canonical order, so that
+        the same data always serializes into the same bytes, with the blank nodes
+        relabelled unless the triples already come from a store."""
+
+        intern = self.term_table.intern
+        public_ids = array(TERM_ID_TYPECODE)
+        private_ids = array(TERM_ID_TYPECODE)
+        grouped_triples: Dict[Node, Dict[Node, List[Node]]] = {}
+        triples = list(triples)
+
+        if relabel:
+            triples = relabel_blank_nodes(document_uri, triples)
+
+        for s, p, o in triples:
+            grouped_triples.setdefault(s, {}).setdefault(p, []).append(o)
+
+        for s, predicate_objects in sorted(
+            grouped_triples.items(), key=lambda i: get_term_sort_key(i[0])
+        ):
+            for p, objects in sorted(
+                predicate_objects.items(), key=lambda i: get_term_sort_key(i[0])
+            ):
+                for o in sorted(objects, key=get_term_sort_key):
+                    triple = (s, p, o)
+                    triple_ids = (
+                        private_ids if is_private_triple(triple) else public_ids
+                    )
+                    triple_ids.extend(intern(t) for t in triple)
+
+        self.documents[document_uri] = public_ids
+
+        if private_ids:
+            self.private_documents[document_uri] = private_ids
+        else:
+            self.private_documents.pop(document_uri, None)
+
+    def get_private(self, document_uri: URIRef) -> DocumentGraph:
+        """Returns a view of all triples of a document, including the private ones."""
+
+        return DocumentGraph(
+            identifier=document_uri,
+            namespace_manager=self.namespace_manager,
+            term_table=self.term_table,
+            triple_ids=self.documents[document_uri]
+            + self.private_documents.get(document_uri, array(TERM_ID_TYPECODE)),
+        )
+
+    def copy(
+        self,
+        namespace_manager: NamespaceManager,
+        exclude: Iterable[URIRef] = (),
+    ) -> "DocumentStore":
+        """Creates a new store sharing the term table and the document arrays,
+        without the excluded documents, for replacing documents without blocking
+        readers of this store. Once the terms of replaced documents have grown
+        the shared table too much, the new store gets a compacted table instead."""
+
+        documents = self.documents.copy()
+        private_documents = self.private_documents.copy()
+        modified = self.modified.copy()
+
+        for document_uri in exclude:
+            documents.pop(document_uri, None)
+            private_documents.pop(document_uri, None)
+            modified.pop(document_uri, None)
+
+        term_table = self.term_table
+        compacted_terms = (
+            len(term_table) if self.compacted_terms is None else self.compacted_terms
+        )
+
+        if len(term_table) > compacted_terms * (1 + TERM_TABLE_SLACK):
+            term_table, (documents, private_documents) = compact_term_table(
+                term_table, documents, private_documents
+            )
+            info(
+                f"Compacted term table from {len(self.term_table)}"
+                f" to {len(term_table)} terms"
+            )
+            compacted_terms = len(term_table)
+
+        return DocumentStore(
+            namespace_manager=namespace_manager,
+            term_table=term_table,
+            documents=documents,
+            private_documents=private_documents,
+            compacted_terms=compacted_terms,
+            modified=modified,
+        )
+
+    @property
+    def triple_count(self) -> int:
+        """The total number of triples stored for all documents."""
+
+        return (
+            sum(len(d) for d in self.documents.values())
+            + sum(len(d) for d in self.private_documents.values())
+        ) // 3
+
+
+# pylint: disable-next=too-many-instance-attributes
+class LazyDocumentStore(Mapping[URIRef, DocumentGraph]):
+    """Mapping of document URIs to their triples, collected from the dataset on
+    first access and kept in a least recently used cache bounded in triples."""
+
+    def __init__(
+        self,
+        dataset: Graph,
+        document_subjects: Dict[URIRef, List[URIRef]],
+        max_triples: int,
+        modified: Dict[URIRef, float] | None = None,
+    ) -> None:
+        self.dataset = dataset
+        self.document_subjects = document_subjects
+        self.max_triples = max_triples
+        self.modified: Dict[URIRef, float] = modified or {}
+        self.namespace_manager = get_namespace_manager(dataset.namespaces())
+        self._documents: OrderedDict[URIRef, DocumentGraph] = OrderedDict()
+        self._lock = Lock()
+        self.triple_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, key: URIRef) -> DocumentGraph:
+        subjects = self.document_subjects[key]
+
+        with self._lock:
+            document_graph = self._documents.get(key)
+            if document_graph is not None:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document_graph
+            self.misses += 1
+
+        # Collect outside the lock, at worst collecting a document twice
+        document_graph = self.collect(document_uri=key, subjects=subjects)
+
+        with self._lock:
+            if key not in self._documents:
+                self._documents[key] = document_graph
+                self.triple_count += len(document_graph)
+            while self.triple_count > self.max_triples and len(self._documents) > 1:
+                _, evicted_graph = self._documents.popitem(last=False)
+                self.triple_count -= len(evicted_graph)
+                self.evictions += 1
+
+        return document_graph
+
+    def __iter__(self) -> Iterator[URIRef]:
+        return iter(self.document_subjects)
+
+    def __len__(self) -> int:
+        return len(self.document_subjects)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.document_subjects
+
+    def get_private(self, document_uri: URIRef) -> Graph:
+        """Returns the dataset, which describes all documents including their
+        private triples, without collecting the document."""
+
+        assert document_uri in self.document_subjects, f"Unknown {document_uri.n3()}"
+
+        return self.dataset
+
+    def collect(self, document_uri: URIRef, subjects: List[URIRef]) -> DocumentGraph:
+        """Collects the CBDs of the subjects of a document into a compact graph of
+        its public triples, with its own term table so that evicting it releases
+        all of its terms."""
+
+        document_graph = Graph()
+
+        for s in subjects:
+            self.dataset.cbd(resource=s, target_graph=document_graph)
+
+        document_store = DocumentStore(namespace_manager=self.namespace_manager)
+        document_store.add(document_uri=document_uri, triples=document_graph)
+
+        return document_store[document_uri]
+
+
+# The document datasets, either collected at startup or on demand
+DocumentDatasets = DocumentStore | LazyDocumentStore
@@ -4,11 +4,17 @@ from typing import Set
 from typing import Tuple
 from typing import Dict
 from typing import Iterable
+from typing import List
 from logging import debug
+from os import stat
 from os.path import splitext
 from functools import cache
 from urllib.parse import urlparse
 
+from jinja2 import meta
+from jinja2 import nodes
+from jinja2 import Environment
+
 from rdflib.term import URIRef
 
 from utils import env_to_path
@@ -24,6 +30,9 @@ TEMPLATE_PATH = env_to_path("TEMPLATE_PATH")
 DEFAULT_DOMAIN = "_"
 DEFAULT_TEMPLATE = "_default.html"
 
+# Template variables that differ between requests, so that the output is not cached
+REQUEST_VARIABLES: Set[str] = set(("request", "session", "g", "get_flashed_messages"))
+
 
 @cache
 def load_templates() -> Dict[str, Dict[str, str]]:
@@ -68,3 +77,46 @@ def find_template(
                 return template_path, type_name
 
     return None, None
+
+
+@cache
+def get_template_files(environment: Environment, template_name: str) -> Tuple[str, ...]:
+    """Finds the files of a template and all the templates it extends, includes or
+    imports, or none when its output depends on the request or on templates that
+    are only known when rendering."""
+
+    files: List[str] = []
+    queue = [template_name]
+    seen = set(queue)
+
+    while queue:
+        name = queue.pop(0)
+        source, filename, _ = environment.loader.get_source(environment, name)
+        ast = environment.parse(source)
+        # Look through all names, as blocks are not covered by undeclared variables
+        if any(n.name in REQUEST_VARIABLES for n in ast.find_all(nodes.Name)):
+            debug(f"Template {name} uses request variables, not caching its output")
+            return ()
+        if filename:
+            files.append(filename)
+        for reference in meta.find_referenced_templates(ast):
+            if reference is None:
+                debug(f"Template {name} has dynamic references, not caching its output")
+                return ()
+            if reference not in seen:
+                seen.add(reference)
+                queue.append(reference)
+
+    return tuple(files)
+
+
+def get_template_modified(environment: Environment, template_name: str) -> int | None:
+    """Finds the latest modification time of a template and its dependencies, in
+    nanoseconds, or None when the output of the template should not be cached."""
+
+    template_files = get_template_files(environment, template_name)
+
+    if not template_files:
+        return None
+
+    return max(stat(f).st_mtime_ns for f in template_files)
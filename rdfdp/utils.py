@@ -1,15 +1,22 @@
 """Helper utilities."""
 
 from os import getenv
+from os import fstat
 from os.path import splitext
+from mmap import mmap
+from mmap import ACCESS_READ
+from typing import Dict
+from typing import List
 from typing import Iterable
 from pathlib import Path
 from hashlib import sha256
-from logging import debug
 from urllib.parse import unquote
 from urllib.parse import urlparse
+from threading import Lock
+from collections import OrderedDict
 
 from rdflib.term import URIRef
+from rdflib.graph import _TripleType
 from rdflib.graph import _SubjectType
 from rdflib.graph import _ObjectType
 from rdflib.graph import Graph
@@ -21,12 +28,20 @@ from flask import request
 
 from constants import FILE_URI_PREFIX
 
-CHUNK_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+# The number of converted Markdown contents to remember, keyed by content hash
+MARKDOWN_CACHE_SIZE = 1024
 
 render_html = Markdown(
     renderer=HTMLRenderer(escape=False, allow_harmful_protocols=False)
 )
 
+# The converted Markdown contents, keyed by the SHA256 checksum of the Markdown
+markdown_cache: OrderedDict[str, str] = OrderedDict()
+markdown_lock = Lock()
+
 
 def get_request_host() -> str:
     """Helper function to get request host with post number."""
@@ -49,12 +64,17 @@ def get_file_sha256sum(path: Path) -> str:
     path_sha256 = sha256(usedforsecurity=False)
 
     with open(path, "rb") as file:
-        while True:
-            chunk = file.read(CHUNK_SIZE)
-            if chunk:
-                path_sha256.update(chunk)
-            else:
-                break
+        # Memory-map large files to hash them in one call without copying
+        if fstat(file.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap(file.fileno(), 0, access=ACCESS_READ) as file_map:
+                path_sha256.update(file_map)
+        else:
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if chunk:
+                    path_sha256.update(chunk)
+                else:
+                    break
 
     return path_sha256.hexdigest()
 
@@ -92,11 +112,17 @@ def env_to_path(key: str, default: str | None = None) -> Path:
     return Path(value).resolve(strict=True)
 
 
-def partition_to_fragment(dataset_uri: URIRef, partition_uri: URIRef) -> URIRef:
-    """Converts partition URIs from RDFLib's VoID generator into fragments."""
+def get_document_uri(uri: URIRef) -> URIRef:
+    """Returns the URI of the document that a resource URI belongs to."""
+    return URIRef(uri.split("#")[0])
+
+
+def partition_to_fragment(dataset_uri: URIRef, partition_name: str) -> URIRef:
+    """Converts the name of a VoID partition into a fragment of the dataset."""
 
-    partition_name = partition_uri.removeprefix(dataset_uri).encode("utf-8")
-    partition_hash = sha256(partition_name, usedforsecurity=False).hexdigest()
+    partition_hash = sha256(
+        partition_name.encode("utf-8"), usedforsecurity=False
+    ).hexdigest()
     partition_fragment = URIRef(value=f"#{partition_hash}", base=dataset_uri)
 
     return partition_fragment
@@ -104,11 +130,27 @@ def partition_to_fragment(dataset_uri: URIRef, partition_uri: URIRef) -> URIRef:
 
 # Configure Mistune
 def markdown_to_html(markdown: str) -> str:
-    """Helper function to convert Markdown into HTML and checking the output."""
+    """Helper function to convert Markdown into HTML and checking the output,
+    reusing the output for content that was converted before."""
+
+    markdown_sha256 = sha256(
+        str(markdown).encode("utf-8"), usedforsecurity=False
+    ).hexdigest()
+
+    with markdown_lock:
+        html_string = markdown_cache.get(markdown_sha256)
+        if html_string is not None:
+            markdown_cache.move_to_end(markdown_sha256)
+            return html_string
 
     html_string = render_html(markdown)
     assert isinstance(html_string, str), "Failed to convert Markdown into HTML"
 
+    with markdown_lock:
+        markdown_cache[markdown_sha256] = html_string
+        while len(markdown_cache) > MARKDOWN_CACHE_SIZE:
+            markdown_cache.popitem(last=False)
+
     return html_string
 
 
@@ -117,7 +159,7 @@ def sort_by_predicate(
     graph: Graph,
     predicate=URIRef,
     reverse=False,
-) -> Iterable[_ObjectType]:
+) -> List[_SubjectType]:
     """Jinja filter for sorting subjects in a graph based on a predicate value."""
 
     return sorted(
@@ -127,12 +169,27 @@ def sort_by_predicate(
     )
 
 
-def remove_file_uris(graph: Graph) -> Graph:
-    """Helper utility to strip all file URIs from a graph, to avoid exposing them."""
+def group_by_predicate(
+    subjects: Iterable[_SubjectType],
+    graph: Graph,
+    predicate=URIRef,
+) -> Dict[_ObjectType | None, List[_SubjectType]]:
+    """Jinja filter for grouping subjects in a graph by each of their predicate
+    values, keeping their order, with subjects without values under None."""
+
+    groups: Dict[_ObjectType | None, List[_SubjectType]] = {}
+
+    for s in subjects:
+        values = list(graph.objects(subject=s, predicate=predicate, unique=True))
+        for value in values or [None]:
+            groups.setdefault(value, []).append(s)
+
+    return groups
+
+
+def is_private_triple(triple: _TripleType) -> bool:
+    """Checks whether a triple refers to a file URI, which must not be exposed."""
 
-    for s, p, o in graph:
-        if isinstance(o, URIRef) and o.startswith(FILE_URI_PREFIX):
-            debug(f"Removing triple with object URI {o.n3()}")
-            graph.remove((s, p, o))
+    o = triple[2]
 
-    return graph
+    return isinstance(o, URIRef) and o.startswith(FILE_URI_PREFIX)